@@ -0,0 +1,148 @@
+"""
+Offline batch mode for re-processing many videos through the provider's Batch API.
+
+Every run of `export` advances each unfinished video as far as the ingested
+results allow and writes the chat completion requests it is still missing
+(chunk summaries, merges, segment extraction) as Batch API JSONL files. After
+the batch has completed, `ingest` stores its output file in the checkpoint and
+the next `export` resumes the videos at the following stage:
+
+    python batch_course.py export --workdir batch/ VIDEO_ID ... (or --videos-file ids.txt)
+    # upload batch/batch-0001-01.jsonl, wait for the batch, download its output
+    python batch_course.py ingest --workdir batch/ output.jsonl
+    python batch_course.py export --workdir batch/        # next stage
+    ...
+    python batch_course.py status --workdir batch/
+
+Finished courses are written to <workdir>/courses/<video_id>.json.
+"""
+import argparse
+import json
+import os
+import sys
+
+from create_course import course_fingerprint, extract_points_and_windows
+from extract_transcripts_main_segments import iter_transcripts_intervals
+from utils.batch import (BATCH_MAX_REQUESTS_PER_FILE, DONE, FAILED, PENDING, BatchCheckpoint,
+                         BatchPending, BatchSession, read_jsonl)
+from utils.course_store import course_store
+from utils.get_transcript import _extract_video_id, get_transcript, read_video_ids
+from utils.llm_cache import batch_session
+from utils.segments import format_segment, merge_intervals
+from utils.transcript import Transcript
+from utils.transcript_service import TranscriptError
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workdir", default="batch",
+                        help="Directory of the checkpoint, batch files and courses")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Advance the videos and write the missing requests")
+    export.add_argument("videos", nargs="*", help="Video IDs or URLs to add to the run")
+    export.add_argument("--videos-file", help="File with one video ID or URL per line")
+    export.add_argument("--max-requests-per-file", type=int,
+                        default=BATCH_MAX_REQUESTS_PER_FILE)
+
+    ingest = commands.add_parser("ingest", help="Store Batch API output or error files")
+    ingest.add_argument("results", nargs="+")
+
+    commands.add_parser("status", help="Print the state of the run")
+    return parser.parse_args()
+
+
+def _read_video_ids(args) -> list:
+    video_ids = list(args.videos)
+    if args.videos_file:
+        video_ids += read_video_ids(args.videos_file)
+    return video_ids
+
+
+def advance_video(checkpoint: BatchCheckpoint, video: dict, courses_dir: str) -> str:
+    """
+    Runs one video through the pipeline with the results ingested so far and
+    returns its new status. Stages whose results are missing record their
+    requests in the checkpoint and stop the video there. Windows that fail
+    with an error leave the video pending with the error recorded, so the next
+    export runs them again; the course is only written once all succeeded.
+    """
+    video_id = video["video_id"]
+    if video["transcript"] is None:
+        try:
+            transcript = get_transcript(video_id)
+        except TranscriptError as e:
+            checkpoint.update_video(video_id, status=FAILED, error=str(e))
+            return FAILED
+        # Pinning the transcript keeps the requests (and their custom IDs) stable
+        checkpoint.update_video(video_id, transcript=json.dumps(transcript.to_entries()))
+    else:
+        transcript = Transcript.from_entries(video["transcript"])
+
+    session = BatchSession(checkpoint, video_id)
+    with batch_session(session):
+        try:
+            points, windows = extract_points_and_windows(transcript)
+        except BatchPending:
+            return PENDING
+        checkpoint.update_video(video_id, points=json.dumps(points, ensure_ascii=False))
+
+        intervals, errors = [], []
+        for idx, window_intervals, error in iter_transcripts_intervals(
+                transcript, points, windows=windows):
+            if error is not None and not isinstance(error, BatchPending):
+                print(f"Error while extracting segments of {video_id} window {idx}: {error}")
+                errors.append(f"window {idx}: {error}")
+            intervals += window_intervals
+    if errors:
+        # The video stays pending, so the next export re-runs the failed windows
+        checkpoint.update_video(video_id, error="; ".join(errors))
+    if session.pending or errors:
+        return PENDING
+
+    merged = merge_intervals(intervals)
+    course_store.save(video_id, transcript, points, merged, course_fingerprint())
+    segments = [format_segment(interval) for interval in merged]
+    checkpoint.update_video(video_id, status=DONE, error=None,
+                            segments=json.dumps(segments, ensure_ascii=False))
+    os.makedirs(courses_dir, exist_ok=True)
+    with open(os.path.join(courses_dir, f"{video_id}.json"), "w", encoding="utf-8") as f:
+        json.dump({"video_id": video_id, "points": points, "segments": segments},
+                  f, ensure_ascii=False, indent=2)
+    return DONE
+
+
+def export(checkpoint: BatchCheckpoint, workdir: str, video_ids: list,
+           max_requests_per_file: int = BATCH_MAX_REQUESTS_PER_FILE) -> None:
+    for video_id in video_ids:
+        try:
+            checkpoint.add_video(_extract_video_id(video_id))
+        except ValueError as e:
+            print(f"Skipping {video_id}: {e}", file=sys.stderr)
+
+    for video in checkpoint.videos(PENDING):
+        status = advance_video(checkpoint, video, os.path.join(workdir, "courses"))
+        print(f"{video['video_id']}: {status}")
+
+    paths = checkpoint.export(workdir, max_requests_per_file)
+    for path in paths:
+        print(f"Wrote {path}")
+    if not paths and checkpoint.videos(PENDING):
+        print("Requests of the pending videos are waiting for results; ingest them first.")
+
+
+def main():
+    args = parse_args()
+    checkpoint = BatchCheckpoint(os.path.join(args.workdir, "checkpoint.sqlite"))
+
+    if args.command == "export":
+        export(checkpoint, args.workdir, _read_video_ids(args), args.max_requests_per_file)
+    elif args.command == "ingest":
+        for path in args.results:
+            counts = checkpoint.ingest(read_jsonl(path))
+            print(f"{path}: {counts}")
+    print(json.dumps(checkpoint.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
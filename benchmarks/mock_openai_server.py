@@ -0,0 +1,213 @@
+"""
+OpenAI-compatible stub used by the offline benchmarks.
+
+Serves `POST /v1/chat/completions` with canned answers built from the bundled
+samples and a configurable latency (streamed as server-sent events when the
+request sets `stream`), plus `GET /transcript` that mimics the
+YouTube transcript service. Run it with:
+
+    MOCK_LLM_LATENCY=0.5 uvicorn benchmarks.mock_openai_server:app --port 8100
+
+and point OPENAI_API_BASE at http://127.0.0.1:8100/v1 and
+YOUTUBE_TRANSCRIPT_SERVICE_URL at http://127.0.0.1:8100.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+
+from utils.segments import format_time, parse_time
+from utils.subtitles import iter_subtitle_entries
+
+SAMPLES_DIR = os.path.join(os.path.dirname(__file__), "..", "samples")
+
+# Seconds every completion takes, plus up to MOCK_LLM_JITTER extra
+MOCK_LLM_LATENCY = float(os.getenv("MOCK_LLM_LATENCY", "0.2"))
+MOCK_LLM_JITTER = float(os.getenv("MOCK_LLM_JITTER", "0.0"))
+
+with open(os.path.join(SAMPLES_DIR, "sample-instructional-points.json"), encoding="utf-8") as f:
+    SAMPLE_POINTS = [point for group in json.load(f) for point in group]
+with open(os.path.join(SAMPLES_DIR, "sample-segments.json"), encoding="utf-8") as f:
+    SAMPLE_SEGMENT_DESCRIPTIONS = [s.split("|", 1)[1].strip() for s in json.load(f)]
+SAMPLE_TRANSCRIPT = list(iter_subtitle_entries(
+    os.path.join(SAMPLES_DIR, "sample-transcript.srt")))
+SAMPLE_DURATION = max(e["start"] + e["duration"] for e in SAMPLE_TRANSCRIPT)
+
+_TIMESTAMP = re.compile(r"\[(\d{2}:\d{2}:\d{2}(?:\.\d+)?)")
+_MINUTES = re.compile(r"-m(\d+)")
+_COMPACT_BASE = re.compile(r"seconds since (\d{2}:\d{2}:\d{2})")
+_COMPACT_OFFSET = re.compile(r"^(\d+) ", re.MULTILINE)
+
+app = FastAPI(title="Mock OpenAI server")
+
+_stats_lock = threading.Lock()
+_stats = {"chat_completions": 0, "prompt_tokens": 0, "completion_tokens": 0,
+          "transcripts": 0}
+
+
+def _count(**increments):
+    with _stats_lock:
+        for key, value in increments.items():
+            _stats[key] += value
+
+
+def _summary_answer() -> str:
+    return "Key instructional points:\n" + "\n".join(
+        f"- {point}" for point in random.sample(SAMPLE_POINTS, 5))
+
+
+def _merge_answer() -> str:
+    return json.dumps({"points": SAMPLE_POINTS[:20]})
+
+
+def _segments_answer(prompt: str) -> str:
+    compact = _COMPACT_BASE.search(prompt)
+    if compact:
+        # Compact prompts list second offsets from the window start and expect JSON
+        base = 0.0
+        timestamps = [float(t) for t in _COMPACT_OFFSET.findall(prompt[compact.end():])]
+    else:
+        base = None
+        timestamps = [parse_time(t) for t in _TIMESTAMP.findall(prompt)]
+    if not timestamps:
+        return ""
+    window_start, window_end = min(timestamps), max(timestamps)
+    lines = []
+    start = window_start
+    idx = int(window_start) // 180
+    # One 30-second segment roughly every three minutes of the window
+    while start + 30 <= window_end:
+        description = SAMPLE_SEGMENT_DESCRIPTIONS[idx % len(SAMPLE_SEGMENT_DESCRIPTIONS)]
+        if base is None:
+            lines.append(f"{format_time(int(start))} – {format_time(int(start) + 30)} | {description}")
+        else:
+            lines.append({"start": int(start), "end": int(start) + 30, "purpose": description})
+        start += 180
+        idx += 1
+    if base is None:
+        return "\n".join(lines)
+    return json.dumps({"segments": lines})
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    system = next((m["content"] for m in messages if m["role"] == "system"), "")
+    prompt = "\n".join(m["content"] for m in messages if m["role"] == "user")
+
+    if "distilling" in system:
+        content = _summary_answer()
+    elif _COMPACT_BASE.search(prompt) or not body.get("response_format"):
+        content = _segments_answer(prompt)
+    else:
+        content = _merge_answer()
+
+    latency = MOCK_LLM_LATENCY + random.uniform(0, MOCK_LLM_JITTER)
+    prompt_tokens = sum(len(m["content"]) for m in messages) // 4
+    completion_tokens = len(content) // 4
+    _count(chat_completions=1, prompt_tokens=prompt_tokens,
+           completion_tokens=completion_tokens)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+    if body.get("stream"):
+        return StreamingResponse(_stream_chunks(body, content, usage, latency),
+                                 media_type="text/event-stream")
+
+    await asyncio.sleep(latency)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": usage,
+    }
+
+
+async def _stream_chunks(body, content: str, usage, latency: float):
+    """
+    Server-sent events of a streamed completion: a fifth of the latency before
+    the first token, the rest spread evenly over the content.
+    """
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    def event(delta, finish_reason=None, chunk_usage=None):
+        choices = [] if delta is None else [
+            {"index": 0, "delta": delta, "finish_reason": finish_reason}]
+        return "data: " + json.dumps({
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "mock"),
+            "choices": choices,
+            "usage": chunk_usage,
+        }) + "\n\n"
+
+    pieces = [content[i: i + 16] for i in range(0, len(content), 16)] or [""]
+    await asyncio.sleep(latency / 5)
+    yield event({"role": "assistant", "content": ""})
+    for piece in pieces:
+        await asyncio.sleep(latency * 4 / 5 / len(pieces))
+        yield event({"content": piece})
+    yield event({}, "stop")
+    if (body.get("stream_options") or {}).get("include_usage"):
+        yield event(None, chunk_usage=usage)
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/transcript")
+async def transcript(video: str = Query(...)):
+    """
+    Returns the sample transcript repeated to the length requested in the video
+    ID ("<anything>-m<minutes>"), or the sample as is.
+    """
+    match = _MINUTES.search(video)
+    target = int(match.group(1)) * 60 if match else SAMPLE_DURATION
+    if target <= 0:
+        raise HTTPException(status_code=404, detail="No transcript")
+
+    entries = []
+    offset = 0.0
+    while offset < target:
+        for entry in SAMPLE_TRANSCRIPT:
+            start = entry["start"] + offset
+            if start >= target:
+                break
+            entries.append(dict(entry, start=round(start, 3)))
+        offset += SAMPLE_DURATION
+    _count(transcripts=1)
+    return entries
+
+
+@app.get("/stats")
+async def stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+@app.post("/reset")
+async def reset():
+    with _stats_lock:
+        for key in _stats:
+            _stats[key] = 0
+    return {"status": "ok"}
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
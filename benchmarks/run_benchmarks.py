@@ -0,0 +1,241 @@
+"""
+Offline end-to-end benchmarks for the course pipeline.
+
+Starts the mock OpenAI/transcript server from `benchmarks.mock_openai_server`,
+points the pipeline at it and measures the individual stages and the
+/create-course endpoint at different transcript lengths and concurrency levels.
+The course store, manifests and job queue live in a temporary directory, so runs
+neither reuse nor pollute the ones in ./.cache.
+Reports p50/p95 latency, throughput, peak Python memory and LLM calls per video.
+
+    python -m benchmarks.run_benchmarks --latency 0.2 --minutes 30,90,180 \\
+        --concurrency 1,4,16 --requests 8 --output bench.json
+
+Exits with status 1 when `--max-p95` is given and an endpoint scenario exceeds it.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import httpx
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2,
+                        help="Seconds every mock LLM call takes")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Extra random latency per mock LLM call, in seconds")
+    parser.add_argument("--minutes", default="30,90,180",
+                        help="Comma-separated transcript lengths in minutes")
+    parser.add_argument("--concurrency", default="1,4",
+                        help="Comma-separated numbers of concurrent stage runs and"
+                             " /create-course requests")
+    parser.add_argument("--requests", type=int, default=4,
+                        help="Requests per endpoint scenario")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Runs per stage scenario")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-endpoint", action="store_true")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--max-p95", type=float,
+                        help="Fail when an endpoint scenario's p95 latency exceeds this")
+    return parser.parse_args()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock_server(latency: float, jitter: float):
+    port = _free_port()
+    env = dict(os.environ, MOCK_LLM_LATENCY=str(latency), MOCK_LLM_JITTER=str(jitter))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.mock_openai_server:app",
+         "--port", str(port), "--log-level", "warning"],
+        env=env)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        if process.poll() is not None:
+            raise RuntimeError("Mock server exited during startup")
+        try:
+            if httpx.get(f"{base_url}/health").status_code == 200:
+                return process, base_url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Mock server did not start")
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(q * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _mock_stats(base_url: str) -> Dict[str, int]:
+    return httpx.get(f"{base_url}/stats").json()
+
+
+def run_scenario(name: str, base_url: str, jobs: List[Callable[[], None]],
+                 concurrency: int, videos: int, **labels) -> Dict:
+    """
+    Runs `jobs` on `concurrency` threads and summarizes their latencies.
+    """
+    httpx.post(f"{base_url}/reset")
+    latencies: List[float] = []
+
+    def timed(job):
+        start = time.perf_counter()
+        job()
+        latencies.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed, jobs))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = _mock_stats(base_url)
+    return dict(
+        scenario=name,
+        concurrency=concurrency,
+        runs=len(jobs),
+        p50_seconds=round(percentile(latencies, 0.5), 3),
+        p95_seconds=round(percentile(latencies, 0.95), 3),
+        throughput_per_second=round(len(jobs) / wall, 3) if wall else 0.0,
+        peak_memory_mb=round(peak / 1024 / 1024, 2),
+        llm_calls_per_video=round(stats["chat_completions"] / max(videos, 1), 2),
+        prompt_tokens_per_video=round(stats["prompt_tokens"] / max(videos, 1)),
+        **labels,
+    )
+
+
+def bench_stages(base_url: str, minutes_list: List[int],
+                 concurrency_list: List[int], repeat: int) -> List[Dict]:
+    from extract_instructional_points import extract_instructional_points
+    from extract_transcripts_main_segments import extract_transcripts_segments
+    from utils.get_transcript import get_transcript
+    from utils.get_transcript_full_text import extract_transcript_text
+
+    results = []
+    for minutes in minutes_list:
+        video_id = f"bench-m{minutes}"
+        transcript = get_transcript(video_id)
+        text = extract_transcript_text(transcript)
+        points = extract_instructional_points(text)
+
+        for concurrency in concurrency_list:
+            results.append(run_scenario(
+                "transcript_fetch", base_url,
+                [lambda: get_transcript(video_id)] * repeat, concurrency, repeat,
+                minutes=minutes))
+            results.append(run_scenario(
+                "instructional_points", base_url,
+                [lambda: extract_instructional_points(text)] * repeat, concurrency, repeat,
+                minutes=minutes))
+            results.append(run_scenario(
+                "segments", base_url,
+                [lambda: extract_transcripts_segments(transcript, points)] * repeat,
+                concurrency, repeat, minutes=minutes))
+    return results
+
+
+def bench_endpoint(base_url: str, minutes_list: List[int],
+                   concurrency_list: List[int], requests: int) -> List[Dict]:
+    from fastapi.testclient import TestClient
+
+    import main
+
+    client = TestClient(main.app)
+    results = []
+    for minutes in minutes_list:
+        for concurrency in concurrency_list:
+            def job(minutes=minutes):
+                # Unique IDs keep the course cache out of the measurement
+                response = client.get("/create-course", params={
+                    "video": f"bench-{uuid.uuid4().hex[:8]}-m{minutes}"})
+                response.raise_for_status()
+
+            results.append(run_scenario(
+                "create_course", base_url, [job] * requests, concurrency, requests,
+                minutes=minutes))
+    return results
+
+
+def print_table(results: List[Dict]) -> None:
+    columns = ["scenario", "minutes", "concurrency", "runs", "p50_seconds",
+               "p95_seconds", "throughput_per_second", "peak_memory_mb",
+               "llm_calls_per_video", "prompt_tokens_per_video"]
+    widths = [max(len(c), *(len(str(r.get(c, ""))) for r in results)) for c in columns]
+    print("  ".join(c.ljust(w) for c, w in zip(columns, widths)))
+    for result in results:
+        print("  ".join(str(result.get(c, "")).ljust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    args = parse_args()
+    minutes_list = [int(m) for m in args.minutes.split(",")]
+    concurrency_list = [int(c) for c in args.concurrency.split(",")]
+
+    process, base_url = start_mock_server(args.latency, args.jitter)
+    workdir = tempfile.TemporaryDirectory(prefix="course-bench-")
+    try:
+        # Must be set before the pipeline modules are imported
+        os.environ.update({
+            "OPENAI_API_BASE": f"{base_url}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "YOUTUBE_TRANSCRIPT_SERVICE_URL": base_url,
+            "ENVIRONMENT": "benchmark",
+            "LLM_CACHE_ENABLED": "false",
+            "LLM_CACHE_PATH": os.path.join(workdir.name, "llm_cache.sqlite"),
+            "COURSE_STORE_PATH": os.path.join(workdir.name, "courses.sqlite"),
+            "COURSE_MANIFEST_PATH": os.path.join(workdir.name, "manifests.sqlite"),
+            "JOB_QUEUE_PATH": os.path.join(workdir.name, "jobs.sqlite"),
+        })
+        # The mock has no provider rate limits; set these to benchmark the scheduler
+        os.environ.setdefault("LLM_MAX_RPM", "1000000")
+        os.environ.setdefault("LLM_MAX_TPM", "1000000000")
+
+        results = []
+        if not args.skip_stages:
+            results += bench_stages(base_url, minutes_list, concurrency_list, args.repeat)
+        if not args.skip_endpoint:
+            results += bench_endpoint(base_url, minutes_list, concurrency_list,
+                                      args.requests)
+    finally:
+        process.terminate()
+        process.wait()
+        workdir.cleanup()
+
+    print_table(results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"latency": args.latency, "results": results}, f, indent=2)
+
+    if args.max_p95 is not None:
+        slow = [r for r in results
+                if r["scenario"] == "create_course" and r["p95_seconds"] > args.max_p95]
+        if slow:
+            print(f"{len(slow)} scenario(s) exceeded p95 {args.max_p95}s", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+import contextvars
+import os
+import queue
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from extract_instructional_points import (
+    MAX_INPUT_TOKENS_PER_CHUNK, MAX_MERGE_INPUT_TOKENS, MERGE_PROMPT_VERSION,
+    SUMMARY_PROMPT_VERSION, extract_instructional_points_from_chunks, iter_text_chunks)
+from extract_transcripts_main_segments import (
+    SEGMENT_PROMPT_COLLAPSE_LINES, SEGMENT_PROMPT_FORMAT, SEGMENT_PROMPT_VERSION,
+    SEGMENT_RELEVANCE_FILTER, SEGMENT_RELEVANCE_KEEP_RATIO, SEGMENT_RELEVANCE_PADDING_SECONDS,
+    iter_transcripts_intervals)
+from utils.course_store import course_store
+from utils.get_transcript import get_transcript, get_transcripts
+from utils.manifest import CourseManifest, content_hash, manifest_store
+from utils.chunk_transcripts import WINDOW_MAX_TOKENS, chunk_transcripts
+from utils.model_routing import routing_signature
+from utils.segments import format_segment, merge_intervals
+from utils.transcript import Transcript
+from utils.transcript_service import TranscriptError
+
+# Called with (stage, completed, total) as the pipeline advances
+StageProgressCallback = Callable[[str, int, int], None]
+# Upper bound on videos of one multi-video request processed at the same time.
+# Their LLM calls all share the process-wide scheduler, which bounds the load.
+MAX_CONCURRENT_VIDEOS = int(os.getenv("MAX_CONCURRENT_VIDEOS", "16"))
+
+
+class IncompleteCourseError(Exception):
+    """
+    Raised by `create_course` when some transcript windows failed. Carries the
+    segments of the windows that succeeded: callers may still return them, but
+    must not keep them as the course of the video.
+    """
+
+    def __init__(self, video_id: str, segments: List[str], failed_windows: int):
+        super().__init__(f"{failed_windows} transcript window(s) of {video_id} failed")
+        self.video_id = video_id
+        self.segments = segments
+        self.failed_windows = failed_windows
+
+
+def course_fingerprint() -> str:
+    """
+    Hash of everything besides the transcript that shapes a course: prompt
+    versions, chunking, prompt and relevance filter settings, and models.
+    Stored courses built with another fingerprint are rebuilt.
+    """
+    return content_hash(
+        SUMMARY_PROMPT_VERSION, MERGE_PROMPT_VERSION, SEGMENT_PROMPT_VERSION,
+        MAX_INPUT_TOKENS_PER_CHUNK, MAX_MERGE_INPUT_TOKENS, WINDOW_MAX_TOKENS,
+        SEGMENT_PROMPT_FORMAT, SEGMENT_PROMPT_COLLAPSE_LINES, SEGMENT_RELEVANCE_FILTER,
+        SEGMENT_RELEVANCE_KEEP_RATIO, SEGMENT_RELEVANCE_PADDING_SECONDS, routing_signature())
+
+
+def extract_points_and_windows(transcript: Transcript, on_progress=None,
+                               manifest: Optional[CourseManifest] = None
+                               ) -> Tuple[List[str], list]:
+    """
+    Extracts the instructional points of a transcript and builds its segment
+    extraction windows at the same time. The entry texts stream into token
+    chunks and every chunk is sent for summarization as soon as it is full,
+    while the windows are tokenized on a background thread.
+
+    Returns the points and the windows (see `chunk_transcripts`).
+    """
+    if isinstance(transcript, Transcript):
+        texts = transcript.texts()
+    else:
+        texts = (entry["text"] for entry in transcript if "text" in entry)
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        windows = executor.submit(chunk_transcripts, transcript)
+        points = extract_instructional_points_from_chunks(
+            iter_text_chunks(texts), on_progress=on_progress, manifest=manifest)
+        return points, windows.result()
+
+
+def create_course(video_id: str,
+                  on_progress: Optional[StageProgressCallback] = None,
+                  transcript: Optional[Transcript] = None):
+    """
+    Runs the whole pipeline for one video: fetches the transcript, extracts the
+    instructional points and returns the important segments of the video.
+    An already fetched `transcript` can be passed to skip the fetch.
+
+    Chunks and windows whose content is unchanged since the last run of the
+    video are reused from its manifest (see `utils.manifest`). Courses whose
+    windows all succeeded are saved in the course store; otherwise
+    `IncompleteCourseError` is raised with the segments that were found.
+
+    `on_progress` is notified per stage ("transcript", "instructional_points",
+    "segments") and, within the LLM stages, per processed chunk.
+    """
+    def report(stage: str):
+        if on_progress is None:
+            return None
+        return lambda completed, total: on_progress(stage, completed, total)
+
+    transcript_progress = report("transcript")
+    if transcript_progress:
+        transcript_progress(0, 1)
+    if transcript is None:
+        transcript = get_transcript(video_id)
+    if transcript_progress:
+        transcript_progress(1, 1)
+
+    manifest = manifest_store.load(video_id)
+    instructional_points, windows = extract_points_and_windows(
+        transcript, on_progress=report("instructional_points"), manifest=manifest)
+
+    intervals, failed = [], 0
+    for idx, window_intervals, error in iter_transcripts_intervals(
+            transcript, instructional_points, on_progress=report("segments"),
+            windows=windows, manifest=manifest):
+        if error is not None:
+            print(f"Error while extracting segments of window {idx}: {error}")
+            failed += 1
+        intervals += window_intervals
+
+    _save_manifest(manifest)
+    merged = merge_intervals(intervals)
+    segments = [format_segment(interval) for interval in merged]
+    if failed:
+        raise IncompleteCourseError(video_id, segments, failed)
+    course_store.save(video_id, transcript, instructional_points, merged,
+                      course_fingerprint())
+    return segments
+
+
+def _save_manifest(manifest: Optional[CourseManifest]) -> None:
+    if manifest is None:
+        return
+    manifest_store.save(manifest)
+    stats = manifest.stats()
+    print(f"Course of {manifest.video_id}: reused {stats['reused_calls']} of "
+          f"{stats['reused_calls'] + stats['computed_calls']} LLM calls from the last run")
+
+
+def iter_course_events(video_id: str,
+                       transcript: Optional[Transcript] = None
+                       ) -> Iterator[Dict[str, Any]]:
+    """
+    Runs the pipeline for one video and yields its results as they become
+    available: the instructional points once the merge finishes, every
+    segment as soon as it is parsed from a streamed answer ("segment"), then
+    the merged segments of each transcript window once that window is done.
+    The final "done" event carries the segments merged across all windows and
+    the number of LLM calls reused from the manifest of the last run. The
+    course is saved in the course store when every window succeeded.
+
+    An already fetched `transcript` can be passed to skip the fetch. Closing
+    the generator stops the pipeline once the windows in progress finish.
+    """
+    if transcript is None:
+        transcript = get_transcript(video_id)
+
+    manifest = manifest_store.load(video_id)
+    instructional_points, windows = extract_points_and_windows(transcript, manifest=manifest)
+    yield {"type": "instructional_points", "points": instructional_points}
+
+    # Windows run on a background thread so that segment events from the
+    # streamed answers can be yielded while the windows are still running
+    results: "queue.Queue" = queue.Queue()
+
+    def on_segment(idx, interval):
+        results.put({"type": "segment", "window": idx, "segment": format_segment(interval)})
+
+    stopped = threading.Event()
+
+    def run_windows():
+        try:
+            with closing(iter_transcripts_intervals(
+                    transcript, instructional_points, windows=windows, manifest=manifest,
+                    on_segment=on_segment)) as window_results:
+                for result in window_results:
+                    if stopped.is_set():
+                        break
+                    results.put(result)
+        except Exception as e:
+            results.put(e)
+        finally:
+            results.put(None)
+
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(run_windows,),
+                              daemon=True)
+    thread.start()
+
+    completed = failed = 0
+    intervals = []
+    try:
+        while (result := results.get()) is not None:
+            if isinstance(result, Exception):
+                raise result
+            if isinstance(result, dict):
+                yield result
+                continue
+            idx, window_intervals, error = result
+            completed += 1
+            if error is not None:
+                print(f"Error while extracting segments of window {idx}: {error}")
+                failed += 1
+                yield {"type": "error", "window": idx, "detail": str(error)}
+            else:
+                intervals += window_intervals
+                yield {"type": "segments", "window": idx,
+                       "segments": [format_segment(i) for i in window_intervals]}
+    finally:
+        # When the consumer stops early (e.g. the client disconnected), the
+        # windows that have not started are skipped and the running ones awaited
+        stopped.set()
+        thread.join()
+
+    _save_manifest(manifest)
+    merged = merge_intervals(intervals)
+    if not failed:
+        course_store.save(video_id, transcript, instructional_points, merged,
+                          course_fingerprint())
+    yield {"type": "done", "windows": completed,
+           "segments": [format_segment(i) for i in merged],
+           **(manifest.stats() if manifest is not None else {})}
+
+
+def iter_courses(video_ids: Iterable[str],
+                 transcripts: Optional[Dict[str, Union[Transcript, TranscriptError]]] = None,
+                 build: Callable[[str, Transcript], Any] = None,
+                 max_concurrency: int = MAX_CONCURRENT_VIDEOS) -> Iterator[Dict[str, Any]]:
+    """
+    Builds the courses of many videos (e.g. a playlist) concurrently and yields
+    a "course" event with the segments of each video, or an "error" event, as
+    soon as that video is done, followed by a final "done" event. A course
+    with failed windows is yielded with its remaining segments and
+    "failed_windows", and counts as failed.
+
+    Transcripts are fetched in bulk unless `transcripts` (from
+    `get_transcripts`) is passed. `build(video_id, transcript)` runs the
+    pipeline for one video and defaults to `create_course`. All chunk-level LLM
+    calls of all videos go through the shared scheduler, so a playlist takes
+    about as long as its longest video as long as the rate limits allow.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    if transcripts is None:
+        transcripts = get_transcripts(video_ids)
+    if build is None:
+        def build(video_id, transcript):
+            return create_course(video_id, transcript=transcript)
+
+    succeeded = failed = 0
+    runnable = []
+    for video_id in video_ids:
+        transcript = transcripts.get(video_id)
+        if isinstance(transcript, Transcript):
+            runnable.append(video_id)
+        else:
+            failed += 1
+            yield {"type": "error", "video_id": video_id,
+                   "detail": str(transcript or "Transcript was not fetched")}
+
+    if runnable:
+        workers = max(1, min(max_concurrency, len(runnable)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Copying the context carries the caller's LLM priority into the workers
+            futures = {
+                executor.submit(contextvars.copy_context().run,
+                                build, video_id, transcripts[video_id]): video_id
+                for video_id in runnable
+            }
+            try:
+                for future in as_completed(futures):
+                    video_id = futures[future]
+                    try:
+                        segments = future.result()
+                    except IncompleteCourseError as e:
+                        print(f"Error while creating the course of {video_id}: {e}")
+                        failed += 1
+                        yield {"type": "course", "video_id": video_id, "segments": e.segments,
+                               "failed_windows": e.failed_windows}
+                    except Exception as e:
+                        print(f"Error while creating the course of {video_id}: {e}")
+                        failed += 1
+                        yield {"type": "error", "video_id": video_id, "detail": str(e)}
+                    else:
+                        succeeded += 1
+                        yield {"type": "course", "video_id": video_id, "segments": segments}
+            finally:
+                # Closing the generator early skips the videos that have not started
+                # and waits for the running ones
+                for future in futures:
+                    future.cancel()
+
+    yield {"type": "done", "succeeded": succeeded, "failed": failed}
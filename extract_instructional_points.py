@@ -1,46 +1,63 @@
 import os
-from openai import OpenAI
 import tiktoken
 import json
+import re
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from typing import Iterable, Iterator, Optional
 
-load_dotenv()
+from utils.llm_cache import cached_chat_completion, streamed_json_completion
+from utils.manifest import CourseManifest, content_hash, reuse_or_compute
+from utils.metrics import track_stage
+from utils.model_routing import model_router, models_for
+from utils.openai_client import client
+from utils.progress import ProgressCallback, ProgressCounter
+from utils.structured_output import POINTS_SCHEMA, json_response_format
 
-# Initialize OpenAI client with configurable base URL
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_API_BASE")
-)
+load_dotenv()
 
-# Default to widely available model
-MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
 MAX_INPUT_TOKENS_PER_CHUNK = 30000
+# Upper bound on the summaries merged by a single call; larger inputs are tree-reduced
+MAX_MERGE_INPUT_TOKENS = int(os.getenv("MAX_MERGE_INPUT_TOKENS", "12000"))
+# Upper bound on chunk summary requests in flight at the same time
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_CHUNK_REQUESTS", "8"))
+# Bump when a prompt changes so manifests of earlier runs are not reused
+SUMMARY_PROMPT_VERSION = 1
+MERGE_PROMPT_VERSION = 2
+# Transcript texts tokenized per batch while streaming them into chunks
+TOKENIZE_BATCH_SIZE = 512
 
 
-def extract_instructional_points(full_text: str) -> list[str]:
+def _summarize_chunk(chunk: str, manifest: Optional[CourseManifest] = None) -> str:
     """
-    [Function docstring remains unchanged]
+    Summarizes the instructional points of a single transcript chunk, reusing
+    the summary of the previous run from `manifest` when the chunk is unchanged.
     """
-    # 1. Token‐encode and chunk text
-    encoding = tiktoken.get_encoding("cl100k_base")
-    token_ids = encoding.encode(full_text)
-    chunks_text = [
-        encoding.decode(token_ids[i: i + MAX_INPUT_TOKENS_PER_CHUNK])
-        for i in range(0, len(token_ids), MAX_INPUT_TOKENS_PER_CHUNK)
-    ]
-
-    # 2. Summarize each chunk using the client
-    chunk_summaries = []
-    for chunk in chunks_text:
-        prompt = (
-            "Using only the information presented in this educational video chunk, "
-            "identify and summarize its key instructional points without including any content that isn’t explicitly covered in the video.\n\n"
-            "-----\n"
-            f"{chunk}\n"
-            "-----\n"
-        )
-        response = client.chat.completions.create(  # Updated client call
-            model=MODEL,
+    key = content_hash("chunk_summary", SUMMARY_PROMPT_VERSION,
+                       models_for("chunk_summary"), chunk)
+    return reuse_or_compute(manifest, "chunk_summary", key, lambda: _request_summary(chunk))
+
+
+def _request_summary(chunk: str) -> str:
+    # A cascade model's summary is kept unless it came back empty
+    return model_router.route(
+        "chunk_summary", lambda model, last: _request_summary_with(chunk, model), bool)
+
+
+def _request_summary_with(chunk: str, model: str) -> str:
+    prompt = (
+        "Using only the information presented in this educational video chunk, "
+        "identify and summarize its key instructional points without including any content that isn’t explicitly covered in the video.\n\n"
+        "-----\n"
+        f"{chunk}\n"
+        "-----\n"
+    )
+    with track_stage("chunk_summary"):
+        response = cached_chat_completion(
+            client,
+            stage="chunk_summary",
+            model=model,
             messages=[
                 {"role": "system",
                     "content": "You specialize in distilling instructional content."},
@@ -50,29 +67,10 @@ def extract_instructional_points(full_text: str) -> list[str]:
             max_tokens=1024,
         )
 
-        summary_text = response.choices[0].message.content.strip()
-        chunk_summaries.append(summary_text)
+    return response.choices[0].message.content.strip()
 
-    # 3. Merge summaries and extract points
-    combined = "\n\n--- End of Chunk Summary ---\n\n".join(chunk_summaries)
-    merge_prompt = (
-        "Merge these summaries and extract instructional points as a JSON array:\n\n"
-        f"{combined}\n\n"
-        "Output format: ['point1', 'point2', ...]"
-    )
-
-    merge_response = client.chat.completions.create(  # Updated client call
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": "Output JSON arrays of key instructional points."},
-            {"role": "user", "content": merge_prompt},
-        ],
-        temperature=0.0,
-        response_format={"type": "json_object"},  # Enforce JSON output
-        max_tokens=2048,
-    )
 
-    raw_output = merge_response.choices[0].message.content.strip()
+def _parse_points(raw_output: str) -> list[str]:
     try:
         data = json.loads(raw_output)
         # Handle different JSON structures
@@ -87,3 +85,211 @@ def extract_instructional_points(full_text: str) -> list[str]:
     except (json.JSONDecodeError, ValueError):
         # Fallback: split lines if JSON parsing fails
         return [line.strip(" -•") for line in raw_output.splitlines() if line.strip()]
+
+
+def _merge_summaries(summaries: list[str],
+                     manifest: Optional[CourseManifest] = None) -> list[str]:
+    """
+    Merges a group of summaries into a list of instructional points with one
+    call, or reuses the points of the previous run from `manifest`.
+    """
+    key = content_hash("merge", MERGE_PROMPT_VERSION, models_for("merge"), summaries)
+    return reuse_or_compute(manifest, "merge", key, lambda: _request_merge(summaries))
+
+
+def _request_merge(summaries: list[str]) -> list[str]:
+    # A cascade model's points are kept when it answered in the requested JSON shape
+    points, _ = model_router.route(
+        "merge", lambda model, last: _request_merge_with(summaries, model),
+        lambda result: result[1] and bool(result[0]))
+    return points
+
+
+def _request_merge_with(summaries: list[str], model: str) -> tuple[list[str], bool]:
+    """
+    Returns the merged points and whether they were parsed from the requested
+    JSON shape rather than recovered from free text.
+    """
+    combined = "\n\n--- End of Chunk Summary ---\n\n".join(summaries)
+    merge_prompt = (
+        "Merge these summaries and extract their instructional points:\n\n"
+        f"{combined}\n\n"
+        'Output format: {"points": ["point1", "point2", ...]}'
+    )
+
+    # Points are parsed from the stream as soon as each string closes
+    points = []
+    with track_stage("merge"):
+        merge_response = streamed_json_completion(
+            client,
+            stage="merge",
+            item_key="points",
+            on_item=points.append,
+            model=model,
+            messages=[
+                {"role": "system", "content": "Output JSON objects listing key instructional points."},
+                {"role": "user", "content": merge_prompt},
+            ],
+            temperature=0.0,
+            response_format=json_response_format(model, "instructional_points", POINTS_SCHEMA),
+            max_tokens=2048,
+        )
+
+    if points:
+        return [str(point) for point in points], True
+    # Only reached when the model ignored the requested shape
+    return _parse_points(merge_response.choices[0].message.content.strip()), False
+
+
+def _point_key(point) -> str:
+    return re.sub(r"[\W_]+", " ", str(point).lower()).strip()
+
+
+def _dedupe_points(points: list, seen: Optional[set] = None) -> list:
+    """
+    Drops points that repeat an earlier one (or one in `seen`) up to case,
+    punctuation and spacing. `seen` is updated with the kept points.
+    """
+    seen = set() if seen is None else seen
+    unique = []
+    for point in points:
+        key = _point_key(point)
+        if key and key not in seen:
+            seen.add(key)
+            unique.append(point)
+    return unique
+
+
+def _group_by_tokens(texts: list[str], encoding, max_tokens: int) -> list[list[str]]:
+    """
+    Splits texts, in order, into consecutive groups of at most `max_tokens`
+    tokens. Every group takes at least two texts when available so each level
+    of the reduce at least halves the number of inputs.
+    """
+    groups = []
+    group, group_tokens = [], 0
+    for text, tokens in zip(texts, (len(t) for t in encoding.encode_ordinary_batch(texts))):
+        if len(group) >= 2 and group_tokens + tokens > max_tokens:
+            groups.append(group)
+            group, group_tokens = [], 0
+        group.append(text)
+        group_tokens += tokens
+    if group:
+        groups.append(group)
+    return groups
+
+
+def _reduce_summaries(summaries: list[str], encoding,
+                      max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                      manifest: Optional[CourseManifest] = None) -> list[str]:
+    """
+    Tree-reduces chunk summaries into a single list of instructional points.
+
+    Summaries that fit in MAX_MERGE_INPUT_TOKENS are merged with a single call.
+    Otherwise they are merged in token-bounded groups, concurrently, and the
+    deduplicated point lists of one level become the inputs of the next, until
+    one group remains. The number of levels therefore follows from the total
+    summary size and grows logarithmically with it.
+    """
+    inputs = summaries
+    while True:
+        if not inputs:
+            # Nothing to merge, e.g. every group's points were duplicates
+            return []
+        groups = _group_by_tokens(inputs, encoding, MAX_MERGE_INPUT_TOKENS)
+        if len(groups) <= 1:
+            return _dedupe_points(_merge_summaries(groups[0], manifest))
+
+        workers = max(1, min(max_concurrency, len(groups)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(contextvars.copy_context().run,
+                                       _merge_summaries, group, manifest)
+                       for group in groups]
+            point_lists = [future.result() for future in futures]
+
+        # Points already produced by an earlier group are not carried upwards
+        seen = set()
+        inputs = []
+        for points in point_lists:
+            unique = _dedupe_points(points, seen)
+            if unique:
+                inputs.append("\n".join(f"- {p}" for p in unique))
+
+
+def iter_text_chunks(texts: Iterable[str],
+                     max_tokens: int = MAX_INPUT_TOKENS_PER_CHUNK) -> Iterator[str]:
+    """
+    Streams transcript texts into chunks of at most `max_tokens` tokens, joined
+    with spaces, and yields each chunk as soon as it is full so its summary can
+    start while the rest is still being tokenized. Chunks are cut between texts;
+    a single text longer than `max_tokens` is cut between tokens.
+    """
+    encoding = tiktoken.get_encoding("cl100k_base")
+    chunk, chunk_tokens = [], 0
+    texts = iter(texts)
+    while True:
+        batch = [text for _, text in zip(range(TOKENIZE_BATCH_SIZE), texts)]
+        if not batch:
+            break
+        for text, tokens in zip(batch, encoding.encode_ordinary_batch(batch)):
+            if not tokens:
+                continue
+            # +1 for the joining space
+            if chunk and chunk_tokens + len(tokens) + 1 > max_tokens:
+                yield " ".join(chunk)
+                chunk, chunk_tokens = [], 0
+            if len(tokens) > max_tokens:
+                for i in range(0, len(tokens) - max_tokens, max_tokens):
+                    yield encoding.decode(tokens[i: i + max_tokens])
+                tail = tokens[(len(tokens) - 1) // max_tokens * max_tokens:]
+                text, tokens = encoding.decode(tail), tail
+            chunk.append(text)
+            chunk_tokens += len(tokens) + 1
+    if chunk:
+        yield " ".join(chunk)
+
+
+def extract_instructional_points_from_chunks(chunks: Iterable[str],
+                                             max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                                             on_progress: Optional[ProgressCallback] = None,
+                                             manifest: Optional[CourseManifest] = None
+                                             ) -> list[str]:
+    """
+    Summarizes text chunks concurrently (at most `max_concurrency` requests in
+    flight), submitting each one as soon as `chunks` produces it, then merges
+    the summaries in chunk order into a single, deduplicated list of points
+    (see `_reduce_summaries`).
+
+    `on_progress` receives (completed, total) calls; the total grows as chunks
+    are produced and the merge counts as the last step. Steps recorded in
+    `manifest` by a previous run with the same input are reused.
+    """
+    encoding = tiktoken.get_encoding("cl100k_base")
+    progress = ProgressCounter(1, on_progress)
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = []
+        for chunk in chunks:
+            # Copying the context carries the caller's LLM priority into the workers
+            future = executor.submit(contextvars.copy_context().run,
+                                     _summarize_chunk, chunk, manifest)
+            progress.grow()
+            future.add_done_callback(progress.advance)
+            futures.append(future)
+        chunk_summaries = [future.result() for future in futures]
+
+    # Merge the summaries (hierarchically when they are too large for one call)
+    points = _reduce_summaries(chunk_summaries, encoding, max_concurrency, manifest)
+    progress.advance()
+    return points
+
+
+def extract_instructional_points(full_text: str,
+                                 max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                                 on_progress: Optional[ProgressCallback] = None) -> list[str]:
+    """
+    Extracts the key instructional points of a video from its full transcript
+    text, split into token-bounded chunks (see
+    `extract_instructional_points_from_chunks`).
+    """
+    return extract_instructional_points_from_chunks(
+        iter_text_chunks([full_text]), max_concurrency, on_progress)
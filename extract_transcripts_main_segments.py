@@ -1,26 +1,53 @@
 import os
 import re
-import json
+import random
+import contextvars
 import tiktoken
-from openai import OpenAI
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import partial
 from dotenv import load_dotenv
-from typing import List
+from typing import Callable, Iterator, List, Optional, Tuple
 
 from utils.chunk_transcripts import chunk_transcripts
-from utils.segments import sort_and_merge_segments
-from utils.transcripts_to_prompt_format import transcripts_to_prompt_format
+from utils.json_stream import JSONArrayStream
+from utils.llm_cache import cached_chat_completion, streamed_json_completion
+from utils.manifest import CourseManifest, content_hash, reuse_or_compute
+from utils.metrics import (SEGMENT_LINES_FILTERED, SEGMENT_PROMPT_TOKENS_SAVED,
+                           SEGMENT_WINDOW_KEPT_RATIO, track_stage)
+from utils.model_routing import STAGE_MODELS, model_router, models_for
+from utils.openai_client import client
+from utils.progress import ProgressCallback, ProgressCounter
+from utils.relevance import filter_relevant_entries
+from utils.segments import (Interval, format_segment, format_time, merge_intervals,
+                            parse_time)
+from utils.structured_output import SEGMENTS_SCHEMA, json_response_format
+from utils.transcripts_to_prompt_format import (transcripts_to_compact_prompt_format,
+                                                transcripts_to_prompt_format)
 
 load_dotenv()
 
-# Initialize OpenAI client with configurable base URL
-client = OpenAI(
-    api_key=os.getenv("OPENAI_API_KEY"),
-    base_url=os.getenv("OPENAI_API_BASE")
-)
+# Model of direct calls; routed calls use the models of the stage (see utils.model_routing)
+MODEL = STAGE_MODELS["segment_extraction"]
+# Upper bound on window extraction requests in flight at the same time
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_SEGMENT_REQUESTS", "8"))
+# "compact" (second offsets from the window start) or "legacy" ([HH:MM:SS.ss] stamps)
+SEGMENT_PROMPT_FORMAT = os.getenv("SEGMENT_PROMPT_FORMAT", "compact").lower()
+# Merge consecutive short caption lines into sentences in the compact prompt
+SEGMENT_PROMPT_COLLAPSE_LINES = os.getenv("SEGMENT_PROMPT_COLLAPSE_LINES", "false").lower() == "true"
+# Only send the lines of a window that match the instructional points (BM25),
+# keeping about SEGMENT_RELEVANCE_KEEP_RATIO of the lines, padding included
+SEGMENT_RELEVANCE_FILTER = os.getenv("SEGMENT_RELEVANCE_FILTER", "false").lower() == "true"
+SEGMENT_RELEVANCE_KEEP_RATIO = float(os.getenv("SEGMENT_RELEVANCE_KEEP_RATIO", "0.3"))
+SEGMENT_RELEVANCE_PADDING_SECONDS = float(os.getenv("SEGMENT_RELEVANCE_PADDING_SECONDS", "10"))
+# Share of windows whose tokens saved by the compact prompt are measured for the
+# segment_prompt_tokens_saved histogram; measuring builds and tokenizes the legacy
+# prompt too, so it is sampled. 0 turns it off
+SEGMENT_PROMPT_SAVINGS_SAMPLE_RATE = float(os.getenv("SEGMENT_PROMPT_SAVINGS_SAMPLE_RATE", "0.05"))
+# Cascade answers with a segment further than this outside their window are escalated
+SEGMENT_WINDOW_SLACK_SECONDS = 5.0
 
-# Default to widely available model
-MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
-MAX_INPUT_TOKENS_PER_CHUNK = 30000
+# Bump when a segment prompt changes so manifests of earlier runs are not reused
+SEGMENT_PROMPT_VERSION = 2
 
 
 def build_prompt(transcript_lines: List[str], educational_points: List[str]) -> str:
@@ -65,55 +92,318 @@ def build_prompt(transcript_lines: List[str], educational_points: List[str]) ->
     return prompt
 
 
-def extract_segments(transcript_lines: List[str], educational_points: List[str]) -> List[str]:
+def build_compact_prompt(transcripts, educational_points: List[str],
+                         collapse: bool = SEGMENT_PROMPT_COLLAPSE_LINES) -> Tuple[str, int]:
     """
-    Takes a list of transcript lines in the format "[HH:MM:SS.ss - HH:MM:SS.ss] text"
-    and a list of educational points, constructs the prompt, sends it to the OpenAI API,
-    and extracts the resulting time segments with descriptions.
+    Token-minimal variant of `build_prompt` that works directly from transcript
+    entries. Each line is "<t> text", where t is whole seconds since the window
+    start, and the model answers in the same offsets.
 
-    Returns a list of strings, each in the format "HH:MM:SS – HH:MM:SS | Description".
+    Returns the prompt and the base time (seconds) the offsets are relative to.
     """
-    # Build the prompt
-    prompt = build_prompt(transcript_lines, educational_points)
+    base, lines = transcripts_to_compact_prompt_format(transcripts, collapse=collapse)
+    points = "\n".join(f"{idx}. {point}" for idx, point in enumerate(educational_points, start=1))
+    prompt = "\n".join([
+        "You are a professor telling a student with very little time before an exam "
+        "exactly which parts of this video section to watch.",
+        "",
+        "Instructional points of the whole video:",
+        points,
+        "",
+        f"Transcript (t = seconds since {format_time(base)}):",
+        *lines,
+        "",
+        'Answer in JSON as {"segments": [{"start": start_t, "end": end_t, '
+        '"purpose": "purpose of this segment"}, ...]}, e.g. '
+        '{"segments": [{"start": 135, "end": 155, "purpose": "Definition of a hash table"}]}.',
+    ])
+    return prompt, base
 
-    # Call OpenAI's chat completion endpoint
-    response = client.chat.completions.create(
-        model=MODEL,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant."},
-            {"role": "user", "content": prompt}
-        ],
-        temperature=0.0,
-        max_tokens=2048,
-    )
 
-    # Extract the assistant's reply text
-    reply_text = response.choices[0].message.content.strip()
+def _request_segments(prompt: str, model: str = MODEL) -> str:
+    """
+    Sends a segment extraction prompt to `model` and returns the reply text.
+    """
+    with track_stage("segment_extraction"):
+        response = cached_chat_completion(
+            client,
+            stage="segment_extraction",
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0,
+            max_tokens=2048,
+        )
+    return response.choices[0].message.content.strip()
+
 
+def _parse_segments(reply_text: str) -> List[Interval]:
     # Use regex to find all time segments with a description, e.g.:
     # "HH:MM:SS – HH:MM:SS | Some description"
     segment_pattern = re.compile(
-        r"(?P<start>\d{2}:\d{2}:\d{2}(?:\.\d{2})?)\s*–\s*"
+        r"(?P<start>\d{2}:\d{2}:\d{2}(?:\.\d{2})?)\s*[–—-]\s*"
         r"(?P<end>\d{2}:\d{2}:\d{2}(?:\.\d{2})?)"
         r"\s*\|\s*(?P<desc>.+)"
     )
+    return [(parse_time(match.group("start")), parse_time(match.group("end")),
+             match.group("desc").strip())
+            for match in segment_pattern.finditer(reply_text)]
+
+
+def extract_segments(transcript_lines: List[str], educational_points: List[str]) -> List[str]:
+    """
+    Takes a list of transcript lines in the format "[HH:MM:SS.ss - HH:MM:SS.ss] text"
+    and a list of educational points, constructs the prompt, sends it to the OpenAI API,
+    and extracts the resulting time segments with descriptions.
+
+    Returns a list of strings, each in the format "HH:MM:SS – HH:MM:SS | Description".
+    """
+    # Build the prompt and call OpenAI's chat completion endpoint
+    prompt = build_prompt(transcript_lines, educational_points)
+    reply_text = _request_segments(prompt)
+    return [format_segment(interval) for interval in _parse_segments(reply_text)]
+
+
+def _compact_interval(item, base: int) -> Optional[Interval]:
+    """
+    Maps a {"start", "end", "purpose"} item of a compact prompt reply back to
+    an absolute interval, or None when the item is malformed.
+    """
+    try:
+        start = base + float(item["start"])
+        end = base + float(item["end"])
+        purpose = str(item["purpose"]).strip()
+    except (KeyError, TypeError, ValueError):
+        return None
+    if end < start or not purpose:
+        return None
+    return start, end, purpose
+
+
+def parse_compact_segments(reply_text: str, base: int) -> List[Interval]:
+    """
+    Parses the JSON reply to a compact prompt and maps the offsets back to
+    absolute (start, end, description) intervals.
+    """
+    intervals = (_compact_interval(item, base)
+                 for item in JSONArrayStream("segments").feed(reply_text))
+    return [interval for interval in intervals if interval is not None]
+
+
+def _report_tokens_saved(chunk, instructional_points, compact_prompt: str) -> None:
+    if random.random() >= SEGMENT_PROMPT_SAVINGS_SAMPLE_RATE:
+        return
+    encoding = tiktoken.get_encoding("cl100k_base")
+    legacy_prompt = build_prompt(transcripts_to_prompt_format(chunk), instructional_points)
+    SEGMENT_PROMPT_TOKENS_SAVED.observe(max(
+        0, len(encoding.encode_ordinary(legacy_prompt)) - len(encoding.encode_ordinary(compact_prompt))))
+
+
+def extract_compact_segments(transcripts, educational_points: List[str],
+                             collapse: bool = SEGMENT_PROMPT_COLLAPSE_LINES,
+                             on_segment: Optional[Callable[[Interval], None]] = None,
+                             model: str = MODEL) -> List[Interval]:
+    """
+    Same as `extract_segments`, but builds the compact prompt straight from the
+    transcript entries of the window and returns numeric intervals.
+
+    The answer is schema-constrained JSON consumed as a stream; `on_segment` is
+    called with every segment as soon as it has been parsed.
+    """
+    prompt, base = build_compact_prompt(transcripts, educational_points, collapse)
+    _report_tokens_saved(transcripts, educational_points, prompt)
+
+    intervals: List[Interval] = []
+
+    def on_item(item):
+        interval = _compact_interval(item, base)
+        if interval is None:
+            return
+        intervals.append(interval)
+        if on_segment is not None:
+            on_segment(interval)
+
+    with track_stage("segment_extraction"):
+        streamed_json_completion(
+            client,
+            stage="segment_extraction",
+            item_key="segments",
+            on_item=on_item,
+            model=model,
+            messages=[
+                {"role": "system", "content": "You are a helpful assistant."},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=0.0,
+            response_format=json_response_format(model, "segments", SEGMENTS_SCHEMA),
+            max_tokens=2048,
+        )
+    return intervals
+
+
+def _extract_chunk_intervals(chunk, instructional_points,
+                             manifest: Optional[CourseManifest] = None,
+                             on_segment: Optional[Callable[[Interval], None]] = None
+                             ) -> List[Interval]:
+    """
+    Extracts and merges the segments of a single transcript window, reusing the
+    segments of the previous run from `manifest` when the window is unchanged.
+    """
+    key = content_hash(
+        "segment_extraction", SEGMENT_PROMPT_VERSION, SEGMENT_PROMPT_FORMAT,
+        SEGMENT_PROMPT_COLLAPSE_LINES, models_for("segment_extraction"), instructional_points,
+        SEGMENT_RELEVANCE_FILTER and (SEGMENT_RELEVANCE_KEEP_RATIO, SEGMENT_RELEVANCE_PADDING_SECONDS),
+        transcripts_to_prompt_format(chunk))
+    intervals = reuse_or_compute(
+        manifest, "segment_extraction", key,
+        lambda: _request_chunk_intervals(chunk, instructional_points, on_segment))
+    # Manifests store intervals as JSON lists
+    return [tuple(interval) for interval in intervals]
+
+
+def _within_window(intervals: List[Interval], chunk) -> bool:
+    """
+    Validation of a cascade answer: at least one segment, all of them inside
+    the window (up to SEGMENT_WINDOW_SLACK_SECONDS).
+    """
+    if not intervals:
+        return False
+    lo = chunk[0]["start"] - SEGMENT_WINDOW_SLACK_SECONDS
+    hi = chunk[-1]["start"] + chunk[-1].get("duration", 0.0) + SEGMENT_WINDOW_SLACK_SECONDS
+    return all(lo <= start and end <= hi for start, end, _ in intervals)
+
+
+def _request_chunk_intervals(chunk, instructional_points,
+                             on_segment: Optional[Callable[[Interval], None]] = None
+                             ) -> List[Interval]:
+    if not len(chunk):
+        return _request_chunk_intervals_with(chunk, instructional_points, MODEL, on_segment)
+
+    # Only the stage model's segments are streamed as they arrive: a cascade
+    # answer might still be escalated, so its segments are passed on once accepted
+    streamed = False
+
+    def attempt(model: str, last: bool) -> List[Interval]:
+        nonlocal streamed
+        streamed = last
+        return _request_chunk_intervals_with(chunk, instructional_points, model,
+                                             on_segment if last else None)
+
+    intervals = model_router.route("segment_extraction", attempt,
+                                   lambda result: _within_window(result, chunk))
+    if on_segment is not None and not streamed:
+        for interval in intervals:
+            on_segment(interval)
+    return intervals
+
+
+def _request_chunk_intervals_with(chunk, instructional_points, model: str,
+                                  on_segment: Optional[Callable[[Interval], None]] = None
+                                  ) -> List[Interval]:
+    if SEGMENT_RELEVANCE_FILTER and len(chunk):
+        filtered = filter_relevant_entries(
+            chunk, instructional_points, SEGMENT_RELEVANCE_KEEP_RATIO,
+            SEGMENT_RELEVANCE_PADDING_SECONDS)
+        SEGMENT_WINDOW_KEPT_RATIO.observe(len(filtered) / len(chunk))
+        SEGMENT_LINES_FILTERED.inc(len(chunk) - len(filtered))
+        chunk = filtered
+
+    if SEGMENT_PROMPT_FORMAT == "legacy":
+        prompt = build_prompt(transcripts_to_prompt_format(chunk), instructional_points)
+        intervals = _parse_segments(_request_segments(prompt, model))
+    else:
+        intervals = extract_compact_segments(chunk, instructional_points,
+                                             on_segment=on_segment, model=model)
+    return merge_intervals(intervals)
+
+
+def iter_transcripts_intervals(transcripts, instructional_points,
+                               max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                               on_progress: Optional[ProgressCallback] = None,
+                               windows: Optional[list] = None,
+                               manifest: Optional[CourseManifest] = None,
+                               on_segment: Optional[Callable[[int, Interval], None]] = None
+                               ) -> Iterator[Tuple[int, List[Interval], Optional[Exception]]]:
+    """
+    Splits the transcript into overlapping windows and yields
+    (window_index, intervals, error) for every window as soon as its extraction
+    finishes, i.e. in completion order. `error` is the exception of a failed
+    window (with empty intervals) and None otherwise.
+
+    Windows are independent of each other, so they are processed on a thread
+    pool with at most `max_concurrency` requests in flight (1 runs them serially).
+    `on_progress` receives (completed, total) calls as windows finish.
+    Windows already built with `chunk_transcripts` can be passed as `windows`,
+    and windows recorded in `manifest` by a previous run are reused.
+    `on_segment` is called with (window_index, interval) for every segment as
+    soon as it is parsed from a streamed answer, before its window finishes.
+    Closing the generator cancels the windows that have not started and waits
+    for the running ones.
+    """
+    chunked_transcripts = chunk_transcripts(transcripts) if windows is None else windows
+    progress = ProgressCounter(len(chunked_transcripts), on_progress)
+    if not chunked_transcripts:
+        return
+
+    workers = max(1, min(max_concurrency, len(chunked_transcripts)))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # Copying the context carries the caller's LLM priority into the workers
+        futures = {
+            executor.submit(contextvars.copy_context().run,
+                            _extract_chunk_intervals, chunk, instructional_points,
+                            manifest,
+                            partial(on_segment, idx) if on_segment else None): idx
+            for idx, chunk in enumerate(chunked_transcripts)
+        }
+        for future in futures:
+            future.add_done_callback(progress.advance)
+
+        try:
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    yield futures[future], [], e
+        finally:
+            # Closing the generator early skips the windows that have not started
+            for future in futures:
+                future.cancel()
+
+
+def iter_transcripts_segments(transcripts, instructional_points,
+                              max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                              on_progress: Optional[ProgressCallback] = None,
+                              windows: Optional[list] = None
+                              ) -> Iterator[Tuple[int, List[str], Optional[Exception]]]:
+    """
+    Same as `iter_transcripts_intervals`, with the intervals of each window
+    formatted as "HH:MM:SS – HH:MM:SS | Description" segments.
+    """
+    for idx, intervals, error in iter_transcripts_intervals(
+            transcripts, instructional_points, max_concurrency, on_progress, windows):
+        yield idx, [format_segment(interval) for interval in intervals], error
+
+
+def extract_transcripts_segments(transcripts, instructional_points,
+                                 max_concurrency: int = MAX_CONCURRENT_REQUESTS,
+                                 on_progress: Optional[ProgressCallback] = None,
+                                 windows: Optional[list] = None,
+                                 manifest: Optional[CourseManifest] = None):
+    """
+    Extracts the important segments of every transcript window and merges them
+    across windows, so segments found twice in overlapping windows (or
+    overlapping each other) are returned once, sorted by start time. A window
+    whose extraction fails is reported and skipped instead of discarding the
+    other windows.
+    """
+    intervals: List[Interval] = []
+    for idx, window_intervals, error in iter_transcripts_intervals(
+            transcripts, instructional_points, max_concurrency, on_progress, windows,
+            manifest):
+        if error is not None:
+            print(f"Error while extracting segments of window {idx}: {error}")
+        intervals += window_intervals
 
-    segments_with_desc = []
-    for match in segment_pattern.finditer(reply_text):
-        start = match.group("start")
-        end = match.group("end")
-        desc = match.group("desc").strip()
-        segments_with_desc.append(f"{start} – {end} | {desc}")
-
-    return segments_with_desc
-
-
-def extract_transcripts_segments(transcripts, instructional_points):
-    chunked_transcripts = chunk_transcripts(transcripts)
-    segments = []
-    for chunk in chunked_transcripts:
-        formatted_transcripts = transcripts_to_prompt_format(chunk)
-        chunk_segments = extract_segments(formatted_transcripts,
-                                          instructional_points)
-        segments += sort_and_merge_segments(chunk_segments)
-    return segments
+    return [format_segment(interval) for interval in merge_intervals(intervals)]
@@ -1,9 +1,21 @@
-from extract_instructional_points import extract_instructional_points
-from extract_transcripts_main_segments import extract_transcripts_segments
-from utils.chunk_transcripts import chunk_transcripts
-from utils.get_transcript_full_text import extract_transcript_text
-from fastapi import FastAPI, HTTPException, Query
-from utils.get_transcript import get_transcript
+from create_course import (MAX_CONCURRENT_VIDEOS, IncompleteCourseError, course_fingerprint,
+                           create_course as build_course, iter_course_events, iter_courses)
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import AsyncIterator, List, Optional
+from utils.admission import Overloaded, admission
+from utils.course_cache import course_cache
+from utils.course_store import course_store
+from utils.get_transcript import _extract_video_id, aget_transcript, aget_transcripts, get_transcript
+from utils.jobs import JobWorkerPool, create_job_queue
+from utils.llm_cache import llm_cache
+from utils.manifest import manifest_store
+from utils.llm_scheduler import PRIORITY_BULK, llm_priority
+from utils.metrics import render_metrics
+from utils.model_routing import model_router
+from utils.transcript_service import TranscriptNotFoundError, TranscriptServiceError
+import asyncio
 import json
 import os
 from dotenv import load_dotenv
@@ -18,19 +30,274 @@ app = FastAPI(
 )
 
 
+@app.exception_handler(TranscriptNotFoundError)
+async def transcript_not_found_handler(request: Request, exc: TranscriptNotFoundError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+
+@app.exception_handler(TranscriptServiceError)
+async def transcript_service_error_handler(request: Request, exc: TranscriptServiceError):
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+
+def _normalize_video(video: str) -> str:
+    try:
+        return _extract_video_id(video)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _stored_or_build(video_id: str, on_progress=None, transcript=None, refresh=False):
+    stored = None if refresh else course_store.segments(video_id, course_fingerprint(), transcript)
+    if stored is not None:
+        return stored
+    return build_course(video_id, on_progress, transcript)
+
+
+def _cached_course(video_id: str, on_progress=None, transcript=None):
+    # Concurrent requests for the same video share one pipeline run. An
+    # IncompleteCourseError is raised to every caller and never cached.
+    return course_cache.get_or_compute(
+        (video_id, course_fingerprint()),
+        lambda: _stored_or_build(video_id, on_progress, transcript))
+
+
+def _run_course_job(video_id: str, on_progress):
+    # Background jobs yield the LLM to interactive requests. A course with
+    # failed windows fails the job, so that it can be submitted again.
+    with llm_priority(PRIORITY_BULK):
+        # Fetched first so that a stored course of an older transcript is rebuilt
+        on_progress("transcript", 0, 1)
+        transcript = get_transcript(video_id)
+        return _cached_course(video_id, on_progress, transcript)
+
+
+job_queue = create_job_queue()
+job_workers = JobWorkerPool(job_queue, _run_course_job)
+
+
+@app.on_event("startup")
+def start_job_workers():
+    job_workers.start()
+
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    job_workers.stop(timeout=5)
+
+
+async def _ndjson(events: AsyncIterator) -> AsyncIterator[str]:
+    async for event in events:
+        yield json.dumps(event, ensure_ascii=False) + "\n"
+
+
+async def _admitted_stream(prepare, build_events, slots: int = 1):
+    """
+    Admits a streaming request before its response starts, so saturation is
+    still answered with 429/503, then streams `build_events(prepared)` on the
+    pipeline executor. `prepare` is awaited first (e.g. to fetch transcripts);
+    the slots are released if it fails.
+    """
+    granted = await admission.acquire(slots)
+    try:
+        prepared = await prepare()
+    except BaseException:
+        granted.release()
+        raise
+    events = admission.stream(granted, lambda: build_events(prepared))
+    # Releases the slots when the client goes away before streaming starts
+    return StreamingResponse(_ndjson(events), media_type="application/x-ndjson",
+                             background=BackgroundTask(granted.release_if_idle))
+
+
+# Keeps the pipelines started for /create-course alive until they finish
+_course_builds = set()
+
+
+async def _build_admitted(video_id: str, key, future, refresh: bool = False) -> None:
+    try:
+        await admission.run(course_cache.complete, key, future,
+                            lambda: _stored_or_build(video_id, refresh=refresh))
+    except BaseException as e:
+        # Not admitted: the requests waiting for this course get the same answer
+        course_cache.abandon(key, future, e)
+
+
+async def _course_for_request(video_id: str, refresh: bool = False):
+    """
+    Returns the course of a video, joining the pipeline already building it
+    if there is one. Only the request that starts a pipeline goes through
+    admission; duplicates wait for its result without a slot or a thread.
+    With `refresh`, the cached and stored course are ignored and rebuilt.
+    """
+    key = (video_id, course_fingerprint())
+    if refresh:
+        course_cache.invalidate(key)
+    future, owner = course_cache.begin(key)
+    if owner:
+        # Runs to the end even if this client goes away, for the other waiters and the cache
+        build = asyncio.ensure_future(_build_admitted(video_id, key, future, refresh))
+        _course_builds.add(build)
+        build.add_done_callback(_course_builds.discard)
+    try:
+        return await asyncio.shield(asyncio.wrap_future(future))
+    except IncompleteCourseError as e:
+        # The segments found are returned, flagged as partial; the next request rebuilds them
+        return JSONResponse(content=e.segments,
+                            headers={"X-Failed-Windows": str(e.failed_windows)})
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
 @app.get("/create-course")
-async def create_course(video: str = Query(..., description="YouTube video URL or ID")):
+async def create_course(video: str = Query(..., description="YouTube video URL or ID"),
+                        refresh: bool = Query(False, description="Rebuild the course even if it is stored")):
+    """
+    Returns the segments of the course. When some transcript windows failed,
+    the segments of the others are returned with an X-Failed-Windows header
+    giving the number of failed windows.
+    """
+    video_id = _normalize_video(video)
+    if not refresh:
+        cached = course_cache.get((video_id, course_fingerprint()))
+        if cached is not None:
+            return cached
+        # SQLite calls, like the pipeline, run off the event loop
+        stored = await asyncio.to_thread(course_store.segments, video_id, course_fingerprint())
+        if stored is not None:
+            return stored
+    # Blocking pipeline code runs on the bounded pipeline executor, never on the loop
+    return await _course_for_request(video_id, refresh)
+
+
+@app.get("/create-course/stream")
+async def create_course_stream(video: str = Query(..., description="YouTube video URL or ID")):
+    """
+    Streams the course as newline-delimited JSON events: the instructional
+    points first, then the segments of each transcript window as it completes.
+    """
+    video_id = _normalize_video(video)
+    # The transcript is fetched up front so its errors still map to a proper status code
+    return await _admitted_stream(
+        lambda: aget_transcript(video_id),
+        lambda transcript: iter_course_events(video_id, transcript))
+
+
+@app.get("/create-courses")
+async def create_courses(videos: List[str] = Query(..., description="YouTube video URLs or IDs, e.g. of a playlist")):
+    """
+    Builds the courses of several videos concurrently and streams them as
+    newline-delimited JSON events, one per video in completion order, then a
+    final "done" event. A playlist takes one pipeline slot per video it
+    builds at the same time.
+    """
+    video_ids = list(dict.fromkeys(_normalize_video(video) for video in videos))
+    slots = min(len(video_ids), MAX_CONCURRENT_VIDEOS, admission.max_active)
+    return await _admitted_stream(
+        lambda: aget_transcripts(video_ids),
+        lambda transcripts: iter_courses(
+            video_ids, transcripts,
+            lambda video_id, transcript: _cached_course(video_id, transcript=transcript),
+            max_concurrency=slots),
+        slots)
+
+
+@app.get("/courses/search")
+async def search_courses(q: str = Query(..., description="Words to look for"),
+                         limit: int = Query(20, ge=1, le=100)):
+    """
+    Full-text search over the instructional points and segment descriptions
+    of every stored course, best matches first.
+    """
+    return {"query": q, "results": await asyncio.to_thread(course_store.search, q, limit)}
+
+
+@app.get("/courses/{video}")
+async def get_course(video: str, include_transcript: bool = False):
+    course = await asyncio.to_thread(course_store.get, _normalize_video(video), include_transcript)
+    if course is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return course
+
+
+@app.get("/courses/{video}/segments")
+async def get_course_segments(video: str,
+                              start: float = Query(0.0, ge=0, description="Seconds"),
+                              end: Optional[float] = Query(None, description="Seconds")):
+    """
+    Segments of a stored course that overlap the [start, end] time range; the
+    range is open-ended without `end`.
+    """
+    segments = await asyncio.to_thread(
+        course_store.segments_in_range,
+        _normalize_video(video), start, float("inf") if end is None else end)
+    if segments is None:
+        raise HTTPException(status_code=404, detail="Course not found")
+    return {"segments": segments}
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(video: str = Query(..., description="YouTube video URL or ID")):
+    video_id = _normalize_video(video)
+    job = await asyncio.to_thread(job_queue.submit, video_id)
+    return {"job_id": job["id"], "status": job["status"]}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    job = await asyncio.to_thread(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/course-cache/stats")
+async def course_cache_stats():
+    return course_cache.stats()
+
+
+@app.get("/course-store/stats")
+async def course_store_stats():
+    return await asyncio.to_thread(course_store.stats)
+
+
+@app.get("/course-manifest/stats")
+async def course_manifest_stats():
+    """
+    LLM calls reused from the manifests of earlier runs (i.e. skipped) and
+    computed by the runs of this process.
+    """
+    return manifest_store.stats()
+
+
+@app.get("/metrics")
+async def metrics():
+    content, content_type = render_metrics()
+    return Response(content=content, media_type=content_type)
+
 
-    transcript = get_transcript(video)
+@app.get("/admission/stats")
+async def admission_stats():
+    return admission.stats()
 
-    transcript_full_text = extract_transcript_text(transcript)
 
-    instructional_points = extract_instructional_points(transcript_full_text)
+@app.get("/model-routing/stats")
+async def model_routing_stats():
+    return model_router.stats()
 
-    segments = extract_transcripts_segments(transcript, instructional_points)
 
-    # Simulate processing
-    return segments
+@app.get("/llm-cache/stats")
+async def llm_cache_stats():
+    return llm_cache.stats()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,60 @@
+"""
+Builds the courses of several videos (e.g. a playlist) concurrently.
+
+    python playlist_course.py VIDEO_ID_OR_URL ... [--videos-file ids.txt] [--output-dir courses/]
+
+Prints one JSON event per line as each video completes ("course" or "error",
+then "done"). With --output-dir every course is also written to
+<output-dir>/<video_id>.json.
+"""
+import argparse
+import json
+import os
+import sys
+
+from create_course import MAX_CONCURRENT_VIDEOS, iter_courses
+from utils.get_transcript import _extract_video_id, read_video_ids
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("videos", nargs="*", help="Video IDs or URLs")
+    parser.add_argument("--videos-file", help="File with one video ID or URL per line")
+    parser.add_argument("--output-dir", help="Write each course to this directory")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_VIDEOS,
+                        help="Videos processed at the same time")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    videos = list(args.videos)
+    if args.videos_file:
+        videos += read_video_ids(args.videos_file)
+    if not videos:
+        sys.exit("No videos given")
+
+    video_ids = []
+    for video in videos:
+        try:
+            video_ids.append(_extract_video_id(video))
+        except ValueError as e:
+            print(f"Skipping {video}: {e}", file=sys.stderr)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    failed = 0
+    for event in iter_courses(video_ids, max_concurrency=args.concurrency):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+        if event["type"] == "error":
+            failed += 1
+        elif event["type"] == "course" and args.output_dir:
+            path = os.path.join(args.output_dir, f"{event['video_id']}.json")
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(event["segments"], f, ensure_ascii=False, indent=2)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+import os
+import sys
+
+# The pipeline modules create their OpenAI client and stores on import
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("LLM_CACHE_ENABLED", "false")
+os.environ.setdefault("COURSE_STORE_ENABLED", "false")
+os.environ.setdefault("COURSE_MANIFEST_ENABLED", "false")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from utils.admission import AdmissionController, Overloaded
+
+
+def test_requests_over_the_limit_wait_in_arrival_order_and_overflow_is_rejected():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=2, queue_timeout=5)
+        granted = []
+        first = await controller.acquire()
+
+        async def wait(name):
+            admission = await controller.acquire()
+            granted.append(name)
+            admission.release()
+
+        waiters = [asyncio.ensure_future(wait(name)) for name in ("second", "third")]
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+        with pytest.raises(Overloaded) as rejected:
+            await controller.acquire()
+        assert rejected.value.status_code == 429
+        assert rejected.value.retry_after >= 1
+
+        first.release()
+        await asyncio.gather(*waiters)
+        assert granted == ["second", "third"]
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_is_answered_with_503():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=1, queue_timeout=0.05)
+        held = await controller.acquire()
+        with pytest.raises(Overloaded) as timed_out:
+            await controller.acquire()
+        assert timed_out.value.status_code == 503
+        assert controller.queued == 0
+        held.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_weighted_request_waits_for_all_its_slots():
+    async def scenario():
+        controller = AdmissionController(max_active=3, max_queued=4, queue_timeout=5)
+        one = await controller.acquire()
+        playlist = asyncio.ensure_future(controller.acquire(slots=3))
+        await asyncio.sleep(0)
+        assert not playlist.done()
+        one.release()
+        admission = await playlist
+        assert controller.active == 3
+        admission.release()
+        admission.release()
+        assert controller.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_run_holds_the_slot_until_the_function_returns():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=1, queue_timeout=5)
+        active = []
+        result = await controller.run(lambda: active.append(controller.active) or "done")
+        await asyncio.sleep(0.01)
+        assert result == "done"
+        assert active == [1]
+        assert controller.active == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,75 @@
+import pytest
+
+import utils.chunk_transcripts as chunking
+from utils.chunk_transcripts import LINE_OVERHEAD_TOKENS, chunk_transcript_ranges, chunk_transcripts
+
+
+class WordEncoding:
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+@pytest.fixture(autouse=True)
+def word_encoding(monkeypatch):
+    # One token per word keeps the budgets predictable and tiktoken offline
+    monkeypatch.setattr(chunking, "_get_encoding", lambda: WordEncoding())
+
+
+def _entries(words_per_entry):
+    return [{"text": " ".join(["w"] * words), "start": float(idx * 5), "duration": 5.0}
+            for idx, words in enumerate(words_per_entry)]
+
+
+def _tokens(entries, start, end):
+    return sum(len(e["text"].split()) + LINE_OVERHEAD_TOKENS for e in entries[start:end])
+
+
+@pytest.mark.parametrize("overlap_tokens", [None, 0, 40])
+def test_windows_respect_the_budget_and_cover_every_entry(overlap_tokens):
+    entries = _entries([3, 8, 1, 20, 5, 13, 2, 9] * 10)
+    max_tokens = 100
+    ranges = chunk_transcript_ranges(entries, max_tokens, overlap_tokens=overlap_tokens)
+
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(entries)
+    for (start, end), (next_start, next_end) in zip(ranges, ranges[1:]):
+        # Windows move forward and leave no gap
+        assert start < next_start <= end < next_end
+    for start, end in ranges:
+        assert start < end
+        assert _tokens(entries, start, end) <= max_tokens
+        # A window stops only because the next entry does not fit
+        if end < len(entries):
+            assert _tokens(entries, start, end + 1) > max_tokens
+
+
+def test_consecutive_windows_overlap_by_about_overlap_tokens():
+    entries = _entries([8] * 50)  # 20 tokens per entry
+    ranges = chunk_transcript_ranges(entries, 100, overlap_tokens=40)
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert _tokens(entries, next_start, end) == 40
+
+
+def test_overlap_by_seconds():
+    entries = _entries([8] * 50)  # an entry every 5 seconds
+    ranges = chunk_transcript_ranges(entries, 100, overlap_seconds=10)
+    for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+        assert entries[end]["start"] - entries[next_start]["start"] <= 10
+
+
+def test_entry_larger_than_the_budget_gets_its_own_window():
+    entries = _entries([5, 500, 5])
+    assert chunk_transcript_ranges(entries, 100, overlap_tokens=0) == [(0, 1), (1, 2), (2, 3)]
+
+
+def test_invalid_overlap_and_empty_input():
+    assert chunk_transcript_ranges([], 100) == []
+    with pytest.raises(ValueError):
+        chunk_transcript_ranges(_entries([1]), 100, overlap_tokens=100)
+
+
+def test_chunk_transcripts_returns_the_entries_of_each_range():
+    entries = _entries([8] * 12)
+    windows = chunk_transcripts(entries, 100, overlap_tokens=0)
+    assert [len(window) for window in windows] == [5, 5, 2]
+    assert windows[1][0] is entries[5]
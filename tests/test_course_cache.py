@@ -0,0 +1,73 @@
+import threading
+import time
+
+import pytest
+
+from utils.course_cache import CourseCache
+
+
+def test_concurrent_callers_share_one_computation():
+    cache = CourseCache()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(None)
+        time.sleep(0.1)
+        return ["segment"]
+
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_compute("v", compute)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(calls) == 1
+    assert results == [["segment"]] * 8
+    assert cache.get("v") == ["segment"]
+
+
+def test_errors_and_empty_results_are_not_cached():
+    cache = CourseCache()
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute("v", lambda: (_ for _ in ()).throw(RuntimeError("boom")))
+    assert cache.get_or_compute("v", lambda: []) == []
+    assert cache.get("v") is None
+    assert cache.get_or_compute("v", lambda: ["segment"]) == ["segment"]
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = CourseCache(max_entries=2)
+    cache.get_or_compute("a", lambda: ["a"])
+    cache.get_or_compute("b", lambda: ["b"])
+    cache.get("a")
+    cache.get_or_compute("c", lambda: ["c"])
+    assert cache.get("b") is None
+    assert cache.get("a") == ["a"]
+
+
+def test_computation_not_started_by_its_owner_is_taken_over():
+    cache = CourseCache()
+    future, owner = cache.begin("v")
+    assert owner
+    # E.g. a playlist worker while the owning request still waits for admission
+    assert cache.get_or_compute("v", lambda: ["taken over"]) == ["taken over"]
+    cache.complete("v", future, lambda: pytest.fail("computed twice"))
+    assert future.result() == ["taken over"]
+
+
+def test_abandoned_computation_fails_its_waiters():
+    cache = CourseCache()
+    future, _ = cache.begin("v")
+    cache.abandon("v", future, RuntimeError("not admitted"))
+    with pytest.raises(RuntimeError):
+        future.result()
+    assert cache.begin("v")[1]
+
+
+def test_invalidate_drops_the_cached_result():
+    cache = CourseCache()
+    cache.get_or_compute("v", lambda: ["old"])
+    cache.invalidate("v")
+    assert cache.get_or_compute("v", lambda: ["new"]) == ["new"]
@@ -0,0 +1,113 @@
+import threading
+import time
+
+from utils.jobs import (FAILED, QUEUED, RUNNING, SUCCEEDED, InMemoryJobQueue, JobWorkerPool,
+                        SQLiteJobQueue)
+
+
+def test_sqlite_claims_jobs_in_submission_order(tmp_path):
+    jobs = SQLiteJobQueue(str(tmp_path / "jobs.sqlite"))
+    first = jobs.submit("a")
+    second = jobs.submit("b")
+
+    claimed = jobs.claim(timeout=0)
+    assert claimed["id"] == first["id"]
+    assert claimed["status"] == RUNNING
+    assert jobs.claim(timeout=0)["id"] == second["id"]
+    assert jobs.claim(timeout=0) is None
+
+
+def test_sqlite_job_is_claimed_once_across_processes(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    submitted = [SQLiteJobQueue(path).submit(f"video{idx}")["id"] for idx in range(40)]
+    # Separate connections to the same file stand in for separate processes
+    queues = [SQLiteJobQueue(path) for _ in range(4)]
+    claimed, lock = [], threading.Lock()
+
+    def work(jobs):
+        while True:
+            job = jobs.claim(timeout=0)
+            if job is None:
+                return
+            with lock:
+                claimed.append(job["id"])
+
+    threads = [threading.Thread(target=work, args=(jobs,)) for jobs in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert sorted(claimed) == sorted(submitted)
+
+
+def test_sqlite_expired_lease_is_claimed_again(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    first = SQLiteJobQueue(path, lease_seconds=0.2)
+    job = first.submit("a")
+    assert first.claim(timeout=0)["id"] == job["id"]
+
+    # A process starting meanwhile leaves the running job alone
+    second = SQLiteJobQueue(path, lease_seconds=0.2)
+    assert second.claim(timeout=0) is None
+    assert second.get(job["id"])["status"] == RUNNING
+
+    time.sleep(0.3)
+    assert second.claim(timeout=0)["id"] == job["id"]
+
+
+def test_sqlite_heartbeat_keeps_the_lease(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    first = SQLiteJobQueue(path, lease_seconds=0.3)
+    second = SQLiteJobQueue(path, lease_seconds=0.3)
+    first.submit("a")
+    job = first.claim(timeout=0)
+    for _ in range(4):
+        time.sleep(0.15)
+        first.heartbeat(job["id"])
+        assert second.claim(timeout=0) is None
+
+
+def test_sqlite_finished_job_is_not_requeued(tmp_path):
+    jobs = SQLiteJobQueue(str(tmp_path / "jobs.sqlite"), lease_seconds=0.05)
+    job = jobs.submit("a")
+    jobs.claim(timeout=0)
+    jobs.update(job["id"], status=SUCCEEDED, result=["segment"])
+    time.sleep(0.1)
+    assert jobs.claim(timeout=0) is None
+    assert jobs.get(job["id"])["result"] == ["segment"]
+
+
+def test_memory_queue_keeps_only_the_latest_finished_jobs():
+    jobs = InMemoryJobQueue(max_finished=2)
+    ids = [jobs.submit(f"video{idx}")["id"] for idx in range(4)]
+    for job_id in ids:
+        jobs.claim(timeout=0)
+        jobs.update(job_id, status=SUCCEEDED)
+    assert [jobs.get(job_id) is not None for job_id in ids] == [False, False, True, True]
+
+
+def test_worker_pool_records_results_errors_and_progress():
+    jobs = InMemoryJobQueue()
+
+    def handler(video_id, on_progress):
+        on_progress("segments", 1, 1)
+        if video_id == "bad":
+            raise RuntimeError("boom")
+        return [video_id]
+
+    pool = JobWorkerPool(jobs, handler, concurrency=2)
+    good, bad = jobs.submit("good"), jobs.submit("bad")
+    pool.start()
+    try:
+        deadline = time.monotonic() + 5
+        while any(jobs.get(j["id"])["status"] in (QUEUED, RUNNING) for j in (good, bad)):
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+    finally:
+        pool.stop(timeout=5)
+
+    assert jobs.get(good["id"])["status"] == SUCCEEDED
+    assert jobs.get(good["id"])["result"] == ["good"]
+    assert jobs.get(good["id"])["progress"] == {"segments": {"completed": 1, "total": 1}}
+    assert jobs.get(bad["id"])["status"] == FAILED
+    assert jobs.get(bad["id"])["error"] == "boom"
@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from utils.json_stream import JSONArrayStream
+
+REPLY = json.dumps({
+    "note": "ignored [not the array]",
+    "segments": [
+        {"start": 0, "end": 12.5, "purpose": "Intro, with \"quotes\" and a ] bracket"},
+        {"start": 30, "end": 45, "purpose": "Nested {\"a\": [1, 2]}", "tags": [1, [2, 3]]},
+    ],
+    "points": ["not", "these"],
+})
+
+
+def _feed_in_pieces(stream: JSONArrayStream, text: str, size: int):
+    items = []
+    for i in range(0, len(text), size):
+        items += stream.feed(text[i:i + size])
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(REPLY)])
+def test_items_survive_any_split(size):
+    stream = JSONArrayStream("segments")
+    assert _feed_in_pieces(stream, REPLY, size) == json.loads(REPLY)["segments"]
+    assert stream.finished
+
+
+def test_items_are_returned_as_soon_as_they_close():
+    stream = JSONArrayStream("segments")
+    first_end = REPLY.index("}, {") + 1
+    assert stream.feed(REPLY[:first_end - 1]) == []
+    assert stream.feed(REPLY[first_end - 1:first_end]) == [json.loads(REPLY)["segments"][0]]
+
+
+@pytest.mark.parametrize("size", [1, 5])
+def test_string_and_scalar_items(size):
+    text = '{"points": ["a, b", "c \\" d", 3, -1.5e2, true, null]}'
+    stream = JSONArrayStream("points")
+    assert _feed_in_pieces(stream, text, size) == ["a, b", 'c " d', 3, -150.0, True, None]
+
+
+def test_top_level_array_without_key():
+    stream = JSONArrayStream()
+    assert _feed_in_pieces(stream, '[{"a": 1}, {"b": [2]}]', 4) == [{"a": 1}, {"b": [2]}]
+    assert stream.finished
+
+
+def test_input_after_the_array_is_ignored():
+    stream = JSONArrayStream("points")
+    assert stream.feed('{"points": ["x"], "segments": ["y"]}') == ["x"]
+    assert stream.feed('["z"]') == []
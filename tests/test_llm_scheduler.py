@@ -0,0 +1,135 @@
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+
+import utils.llm_scheduler as scheduler_module
+from utils.llm_scheduler import PRIORITY_BULK, PRIORITY_INTERACTIVE, LLMScheduler, TokenBucket
+
+
+@pytest.fixture(autouse=True)
+def fixed_estimate(monkeypatch):
+    # Keeps tiktoken (and its encoding download) out of the scheduler tests
+    monkeypatch.setattr(scheduler_module, "estimate_tokens", lambda params: 10)
+
+
+def _wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_token_bucket_reserves_up_to_capacity_then_waits():
+    bucket = TokenBucket(per_minute=60)
+    assert bucket.reserve(60) == 0.0
+    # One unit per second once the bucket is empty
+    assert bucket.reserve(2) == pytest.approx(2.0, abs=0.05)
+
+
+def test_token_bucket_refund_covers_later_reservations():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+    bucket.refund(30)
+    assert bucket.reserve(30) == pytest.approx(0.0, abs=0.05)
+
+
+def test_token_bucket_caps_oversize_reservations_at_capacity():
+    bucket = TokenBucket(per_minute=60)
+    bucket.reserve(60)
+    assert bucket.reserve(1000) == pytest.approx(60.0, abs=0.1)
+
+
+def _submit_in_thread(scheduler, order, name, priority, gate=None):
+    def call():
+        if gate is not None:
+            gate.wait(5)
+        order.append(name)
+
+    thread = threading.Thread(target=scheduler.submit, args=(call, {}, priority))
+    thread.start()
+    return thread
+
+
+def test_waiting_calls_are_served_by_priority_then_arrival():
+    scheduler = LLMScheduler(max_rpm=1e6, max_tpm=1e9, max_concurrency=1)
+    order, gate = [], threading.Event()
+    threads = [_submit_in_thread(scheduler, order, "running", PRIORITY_BULK, gate)]
+    _wait_until(lambda: scheduler.stats()["in_flight"] == 1)
+
+    for idx in range(3):
+        threads.append(_submit_in_thread(scheduler, order, f"bulk{idx}", PRIORITY_BULK))
+        _wait_until(lambda: scheduler.stats()["waiting"] == idx + 1)
+    threads.append(_submit_in_thread(scheduler, order, "interactive", PRIORITY_INTERACTIVE))
+    _wait_until(lambda: scheduler.stats()["waiting"] == 4)
+
+    gate.set()
+    for thread in threads:
+        thread.join(5)
+    assert order == ["running", "interactive", "bulk0", "bulk1", "bulk2"]
+
+
+def test_rate_limited_calls_wait_in_the_queue_without_a_slot():
+    # 600 RPM: one request every 0.1 s once the bucket is drained
+    scheduler = LLMScheduler(max_rpm=600, max_tpm=1e9, max_concurrency=4)
+    scheduler._requests.reserve(600)
+    order = []
+
+    threads = [_submit_in_thread(scheduler, order, f"bulk{idx}", PRIORITY_BULK)
+               for idx in range(3)]
+    _wait_until(lambda: scheduler.stats()["waiting"] >= 2)
+    # Waiting for the rate limit does not take a concurrency slot
+    assert scheduler.stats()["in_flight"] == 0
+    threads.append(_submit_in_thread(scheduler, order, "interactive", PRIORITY_INTERACTIVE))
+    for thread in threads:
+        thread.join(5)
+
+    assert len(order) == 4
+    assert order.index("interactive") < order.index("bulk2")
+
+
+def _rate_limit_error() -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": "0"})
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+def test_rate_limit_halves_the_concurrency_limit_and_retries():
+    scheduler = LLMScheduler(max_rpm=1e6, max_tpm=1e9, max_concurrency=8, backoff=0)
+    attempts = []
+
+    def call():
+        attempts.append(None)
+        if len(attempts) == 1:
+            raise _rate_limit_error()
+        return "ok"
+
+    assert scheduler.submit(call, {}) == "ok"
+    assert len(attempts) == 2
+    # Halved to 4 by the 429, then one additive step for the success
+    assert scheduler._limit == pytest.approx(4 + 1 / 4)
+    assert scheduler.concurrency_limit == 4
+
+
+def test_successful_calls_grow_the_limit_up_to_the_maximum():
+    scheduler = LLMScheduler(max_rpm=1e6, max_tpm=1e9, max_concurrency=2)
+    scheduler._adjust_limit(1)
+    for _ in range(10):
+        scheduler.submit(lambda: "ok", {})
+    assert scheduler.concurrency_limit == 2
+
+
+def test_retries_give_up_after_max_retries():
+    scheduler = LLMScheduler(max_rpm=1e6, max_tpm=1e9, max_retries=2, backoff=0)
+    attempts = []
+
+    def call():
+        attempts.append(None)
+        raise _rate_limit_error()
+
+    with pytest.raises(openai.RateLimitError):
+        scheduler.submit(call, {})
+    assert len(attempts) == 3
+    assert scheduler.stats()["in_flight"] == 0
@@ -0,0 +1,71 @@
+import itertools
+import math
+
+import extract_instructional_points as points_module
+from extract_instructional_points import MAX_MERGE_INPUT_TOKENS, _reduce_summaries
+
+
+class WordEncoding:
+    # One token per word, enough for the token-bounded grouping
+    def encode_ordinary_batch(self, texts):
+        return [text.split() for text in texts]
+
+
+def _oversize(label: str) -> str:
+    # Two of these fit in one merge call, three do not
+    return label + " word" * (MAX_MERGE_INPUT_TOKENS // 2 - 1)
+
+
+def test_reduce_finishes_in_log2_levels(monkeypatch):
+    ids = itertools.count()
+    calls = []
+
+    def merge(group, manifest=None):
+        calls.append(len(group))
+        # Every merge yields one new oversize point, so each level only halves the inputs
+        return [_oversize(f"point{next(ids)}")]
+
+    levels = []
+    group_by_tokens = points_module._group_by_tokens
+
+    def counting_group_by_tokens(texts, encoding, max_tokens):
+        levels.append(len(texts))
+        return group_by_tokens(texts, encoding, max_tokens)
+
+    monkeypatch.setattr(points_module, "_merge_summaries", merge)
+    monkeypatch.setattr(points_module, "_group_by_tokens", counting_group_by_tokens)
+
+    summaries = [_oversize(f"summary{i}") for i in range(64)]
+    result = _reduce_summaries(summaries, WordEncoding(), max_concurrency=4)
+
+    assert len(result) == 1
+    assert len(levels) == math.ceil(math.log2(len(summaries)))
+    assert levels == [64, 32, 16, 8, 4, 2]
+    assert all(size <= 2 for size in calls)
+
+
+def test_reduce_returns_no_points_when_every_group_dedupes_to_nothing(monkeypatch):
+    calls = []
+
+    def merge(group, manifest=None):
+        calls.append(group)
+        return []
+
+    monkeypatch.setattr(points_module, "_merge_summaries", merge)
+
+    summaries = [_oversize(f"summary{i}") for i in range(4)]
+    assert _reduce_summaries(summaries, WordEncoding()) == []
+    assert [] not in calls
+
+
+def test_reduce_merges_small_input_with_one_call(monkeypatch):
+    calls = []
+
+    def merge(group, manifest=None):
+        calls.append(group)
+        return ["Point A", "point a.", "Point B"]
+
+    monkeypatch.setattr(points_module, "_merge_summaries", merge)
+
+    assert _reduce_summaries(["one", "two"], WordEncoding()) == ["Point A", "Point B"]
+    assert calls == [["one", "two"]]
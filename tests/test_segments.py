@@ -0,0 +1,39 @@
+from utils.segments import format_segment, merge_intervals, parse_segment, sort_and_merge_segments
+
+
+def test_merge_intervals_sorts_and_merges_overlaps_and_small_gaps():
+    intervals = [(50.0, 60.0, "C"), (0.0, 10.0, "A"), (10.5, 20.0, "B"), (5.0, 8.0, "A2")]
+    assert merge_intervals(intervals) == [(0.0, 20.0, "A / A2 / B"), (50.0, 60.0, "C")]
+
+
+def test_merge_intervals_keeps_intervals_further_apart_than_max_gap():
+    intervals = [(0.0, 10.0, "A"), (11.5, 20.0, "B")]
+    assert merge_intervals(intervals) == intervals
+    assert merge_intervals(intervals, max_gap=2.0) == [(0.0, 20.0, "A / B")]
+
+
+def test_merge_intervals_drops_repeated_descriptions_of_overlapping_windows():
+    intervals = [(0.0, 10.0, "Gradient descent"), (2.0, 12.0, "gradient  descent."),
+                 (3.0, 4.0, "Learning rate")]
+    assert merge_intervals(intervals) == [(0.0, 12.0, "Gradient descent / Learning rate")]
+
+
+def test_merge_intervals_of_nothing():
+    assert merge_intervals([]) == []
+
+
+def test_contained_interval_does_not_shrink_the_merged_one():
+    assert merge_intervals([(0.0, 30.0, "A"), (5.0, 10.0, "B")]) == [(0.0, 30.0, "A / B")]
+
+
+def test_segments_round_trip():
+    interval = (3725.5, 3730.0, "Backpropagation")
+    segment = format_segment(interval)
+    assert segment == "01:02:05.50 – 01:02:10 | Backpropagation"
+    assert parse_segment(segment) == interval
+
+
+def test_sort_and_merge_segments():
+    segments = ["00:01:00 – 00:01:10 | B", "00:00:00 – 00:00:30 | A", "00:00:30 – 00:00:40 | A2"]
+    assert sort_and_merge_segments(segments) == [
+        "00:00:00 – 00:00:40 | A / A2", "00:01:00 – 00:01:10 | B"]
@@ -0,0 +1,47 @@
+from utils.subtitles import iter_subtitle_entries
+
+SRT = (
+    "﻿1\r\n"
+    "00:00:01,000 --> 00:00:03,500\r\n"
+    "Hello there\r\n"
+    "second line\r\n"
+    "\r\n"
+    "2\r\n"
+    "00:00:04,000 --> 00:00:06,000\r\n"
+    "General Kenobi\r\n"
+)
+
+VTT = """WEBVTT
+Kind: captions
+
+NOTE a comment
+that spans lines
+
+intro
+00:01.000 --> 00:02.500 align:start position:0%
+<c.colorE5E5E5>Welcome</c> <00:01.500>back
+
+00:00:03.000 --> 00:00:04.000
+Next cue
+"""
+
+
+def test_srt_with_bom_and_crlf():
+    assert list(iter_subtitle_entries(SRT.encode("utf-8"))) == [
+        {"text": "Hello there second line", "start": 1.0, "duration": 2.5},
+        {"text": "General Kenobi", "start": 4.0, "duration": 2.0},
+    ]
+
+
+def test_vtt_drops_metadata_settings_and_tags():
+    assert list(iter_subtitle_entries(VTT.encode("utf-8"))) == [
+        {"text": "Welcome back", "start": 1.0, "duration": 1.5},
+        {"text": "Next cue", "start": 3.0, "duration": 1.0},
+    ]
+
+
+def test_end_time_on_the_following_line(tmp_path):
+    path = tmp_path / "captions.srt"
+    path.write_text("1\n00:00:01,000 -->\n00:00:02,000\nSplit timing\n", encoding="utf-8")
+    assert list(iter_subtitle_entries(str(path))) == [
+        {"text": "Split timing", "start": 1.0, "duration": 1.0}]
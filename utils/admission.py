@@ -0,0 +1,240 @@
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from utils.metrics import PIPELINES_ACTIVE, PIPELINES_QUEUED, PIPELINES_REJECTED
+
+load_dotenv()
+
+# Course pipelines running at the same time in this process
+MAX_ACTIVE_PIPELINES = int(os.getenv("MAX_ACTIVE_PIPELINES", "8"))
+# Requests allowed to wait for a free pipeline; more are rejected with 429
+MAX_QUEUED_PIPELINES = int(os.getenv("MAX_QUEUED_PIPELINES", "32"))
+# Longest a request waits for a pipeline before it is rejected with 503
+PIPELINE_QUEUE_TIMEOUT_SECONDS = float(os.getenv("PIPELINE_QUEUE_TIMEOUT_SECONDS", "30"))
+
+_DONE = object()
+
+
+class Overloaded(Exception):
+    """
+    Raised when a request is not admitted. `status_code` is 429 when the
+    queue is full and 503 when the request timed out in the queue.
+    """
+
+    def __init__(self, status_code: int, retry_after: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps the course pipelines running in the process and the requests waiting
+    for one, so that a burst is answered quickly with 429/503 and Retry-After
+    instead of piling up threads and latency. A request takes one slot per
+    pipeline it runs at the same time (a playlist takes several), and waiting
+    requests are admitted in arrival order.
+
+    Blocking pipeline code runs on a dedicated executor, which keeps it off the
+    event loop and out of the shared threadpool. Slots are held until that
+    code has actually returned, even when the client went away earlier.
+    """
+
+    def __init__(self, max_active: int = MAX_ACTIVE_PIPELINES,
+                 max_queued: int = MAX_QUEUED_PIPELINES,
+                 queue_timeout: float = PIPELINE_QUEUE_TIMEOUT_SECONDS):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        # Recent pipeline durations, used to estimate Retry-After
+        self._average_seconds = 30.0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=max_active,
+                                            thread_name_prefix="pipeline")
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def retry_after(self) -> int:
+        """
+        Seconds until a slot is likely to be free: the queue ahead drains one
+        batch of `max_active` pipelines per average pipeline duration.
+        """
+        batches = (self.queued + self.active) / max(1, self.max_active)
+        return max(1, round(batches * self._average_seconds))
+
+    def _set_gauges(self) -> None:
+        PIPELINES_ACTIVE.set(self.active)
+        PIPELINES_QUEUED.set(self.queued)
+
+    def _wake(self) -> None:
+        # Grants slots to the waiters at the head of the queue that now fit
+        while self._waiters:
+            weight, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.active + weight > self.max_active:
+                break
+            self._waiters.popleft()
+            self.active += weight
+            waiter.set_result(None)
+        self._set_gauges()
+
+    async def acquire(self, slots: int = 1) -> "Admission":
+        """
+        Waits for `slots` pipeline slots (capped at `max_active`), or raises
+        `Overloaded` when the queue is full or the wait times out. The returned
+        admission must be released.
+        """
+        self._loop = asyncio.get_running_loop()
+        slots = max(1, min(slots, self.max_active))
+        if not self._waiters and self.active + slots <= self.max_active:
+            self.active += slots
+            self._set_gauges()
+            return Admission(self, slots)
+
+        if self.queued >= self.max_queued:
+            PIPELINES_REJECTED.labels("queue_full").inc()
+            raise Overloaded(429, self.retry_after(), "Too many courses are being built")
+        waiter = self._loop.create_future()
+        self._waiters.append((slots, waiter))
+        self._set_gauges()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            PIPELINES_REJECTED.labels("queue_timeout").inc()
+            raise Overloaded(503, self.retry_after(), "Timed out waiting for a free pipeline")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the request went away
+                self._release_now(slots, time.monotonic())
+            raise
+        finally:
+            # Drops the waiter if it gave up and lets the next ones in
+            self._wake()
+        return Admission(self, slots)
+
+    def _release_now(self, slots: int, started: float) -> None:
+        self.active -= slots
+        self._average_seconds = 0.8 * self._average_seconds + 0.2 * (time.monotonic() - started)
+        self._wake()
+
+    def _release(self, slots: int, started: float) -> None:
+        # Releases come from the loop, executor threads and response background tasks
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._release_now(slots, started)
+        else:
+            self._loop.call_soon_threadsafe(self._release_now, slots, started)
+
+    def _submit(self, fn: Callable[..., Any], *args) -> Future:
+        # Copying the context carries the caller's LLM priority into the thread
+        return self._executor.submit(contextvars.copy_context().run, fn, *args)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """
+        Runs the blocking `fn(*args)` on the pipeline executor once admitted.
+        The slot is released when `fn` returns, not when the caller stops
+        waiting for it.
+        """
+        admission = await self.acquire()
+        try:
+            future = self._submit(fn, *args)
+        except BaseException:
+            admission.release()
+            raise
+        future.add_done_callback(lambda _: admission.release())
+        return await asyncio.wrap_future(future)
+
+    async def stream(self, admission: "Admission",
+                     events: Callable[[], Iterator[Any]]) -> AsyncIterator[Any]:
+        """
+        Drives the blocking iterator returned by `events()` on the pipeline
+        executor and yields its items. When the client disconnects, the
+        iterator is closed (which stops a generator's pipeline) once its
+        current step returns, and only then is `admission` released.
+        """
+        admission.in_use = True
+        iterator = pending = None
+        try:
+            pending = self._submit(events)
+            iterator = await asyncio.wrap_future(pending)
+            while True:
+                pending = self._submit(next, iterator, _DONE)
+                item = await asyncio.wrap_future(pending)
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # Nothing can be awaited here once the response was cancelled
+            self._submit(_close_after, pending, iterator).add_done_callback(
+                lambda _: admission.release())
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "max_active": self.max_active,
+            "max_queued": self.max_queued,
+        }
+
+
+def _close_after(pending: Optional[Future], iterator: Optional[Iterator[Any]]) -> None:
+    # Waits for the step in progress, then closes the iterator (its result,
+    # when the step was the call creating it)
+    if pending is not None:
+        try:
+            result = pending.result()
+        except BaseException:
+            result = None
+        if iterator is None:
+            iterator = result
+    close = getattr(iterator, "close", None)
+    if close is not None:
+        close()
+
+
+class Admission:
+    """
+    Granted pipeline slots. `release` is idempotent. Once `in_use` is set by
+    `AdmissionController.stream`, the stream releases the slots itself, so
+    `release_if_idle` (for a response background task) only releases slots of
+    a stream that never started.
+    """
+
+    def __init__(self, controller: AdmissionController, slots: int = 1):
+        self.slots = slots
+        self.in_use = False
+        self._controller = controller
+        self._started = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self) -> None:
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(self.slots, self._started)
+
+    def release_if_idle(self) -> None:
+        if not self.in_use:
+            self.release()
+
+
+admission = AdmissionController()
@@ -0,0 +1,243 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+from utils.llm_cache import make_cache_key
+from utils.metrics import LLM_CALLS
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+# Provider limit on requests per batch input file
+BATCH_MAX_REQUESTS_PER_FILE = 50000
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class BatchPending(Exception):
+    """
+    Raised by a chat completion whose result is not in the batch checkpoint yet.
+    """
+
+    def __init__(self, custom_id: str):
+        super().__init__(f"Waiting for batch result {custom_id}")
+        self.custom_id = custom_id
+
+
+def make_custom_id(video_id: str, stage: str, key: str) -> str:
+    """
+    Stable ID of a batch request: the same request of the same video always
+    gets the same ID, so re-exports and results line up across runs.
+    """
+    return f"{video_id}:{stage}:{key[:24]}"
+
+
+class BatchCheckpoint:
+    """
+    SQLite checkpoint of an offline batch run: the videos with their transcript
+    and state, every chat completion request the pipeline asked for, in which
+    export round it was written and the response once it has been ingested.
+    """
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS videos ("
+            " video_id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " transcript TEXT,"
+            " points TEXT,"
+            " segments TEXT,"
+            " error TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS requests ("
+            " custom_id TEXT PRIMARY KEY,"
+            " video_id TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " body TEXT NOT NULL,"
+            " round INTEGER,"
+            " response TEXT,"
+            " error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS requests_key ON requests (key)")
+        self._db.commit()
+
+    # Videos
+
+    def add_video(self, video_id: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO videos (video_id, status, updated_at)"
+                " VALUES (?, ?, ?)", (video_id, PENDING, time.time()))
+            self._db.commit()
+
+    def update_video(self, video_id: str, **fields) -> None:
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._db.execute(
+                f"UPDATE videos SET {columns}, updated_at = ? WHERE video_id = ?",
+                (*fields.values(), time.time(), video_id))
+            self._db.commit()
+
+    def videos(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query = "SELECT video_id, status, transcript, points, segments, error FROM videos"
+        args = ()
+        if status is not None:
+            query += " WHERE status = ?"
+            args = (status,)
+        with self._lock:
+            rows = self._db.execute(query + " ORDER BY video_id", args).fetchall()
+        return [
+            {"video_id": video_id, "status": status_, "error": error,
+             "transcript": json.loads(transcript) if transcript else None,
+             "points": json.loads(points) if points else None,
+             "segments": json.loads(segments) if segments else None}
+            for video_id, status_, transcript, points, segments, error in rows
+        ]
+
+    # Requests
+
+    def record(self, video_id: str, stage: str, key: str, params: Dict[str, Any]) -> str:
+        custom_id = make_custom_id(video_id, stage, key)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR IGNORE INTO requests (custom_id, video_id, stage, key, body)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (custom_id, video_id, stage, key,
+                 json.dumps(params, ensure_ascii=False, default=str)))
+            self._db.commit()
+        return custom_id
+
+    def response(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT response FROM requests WHERE key = ? AND response IS NOT NULL"
+                " LIMIT 1", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def export(self, directory: str,
+               max_requests_per_file: int = BATCH_MAX_REQUESTS_PER_FILE) -> List[str]:
+        """
+        Writes the recorded requests that have not been exported yet (or whose
+        previous result failed) as Batch API input files and marks them with a
+        new round number. Returns the written paths.
+        """
+        with self._lock:
+            (last_round,) = self._db.execute(
+                "SELECT COALESCE(MAX(round), 0) FROM requests").fetchone()
+            rows = self._db.execute(
+                "SELECT custom_id, body FROM requests"
+                " WHERE (round IS NULL OR error IS NOT NULL) AND response IS NULL"
+                " ORDER BY custom_id").fetchall()
+            if not rows:
+                return []
+
+            round_ = last_round + 1
+            os.makedirs(directory, exist_ok=True)
+            paths = []
+            for part, offset in enumerate(range(0, len(rows), max_requests_per_file), start=1):
+                path = os.path.join(directory, f"batch-{round_:04d}-{part:02d}.jsonl")
+                with open(path, "w", encoding="utf-8") as f:
+                    for custom_id, body in rows[offset: offset + max_requests_per_file]:
+                        f.write(json.dumps({
+                            "custom_id": custom_id,
+                            "method": "POST",
+                            "url": BATCH_ENDPOINT,
+                            "body": json.loads(body),
+                        }, ensure_ascii=False) + "\n")
+                paths.append(path)
+
+            self._db.executemany(
+                "UPDATE requests SET round = ?, error = NULL WHERE custom_id = ?",
+                [(round_, custom_id) for custom_id, _ in rows])
+            self._db.commit()
+        return paths
+
+    def ingest(self, results: Iterator[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Stores the lines of a Batch API output (or error) file. Failed requests
+        are queued for the next export. Returns counts of what was ingested.
+        """
+        counts = {"succeeded": 0, "failed": 0, "unknown": 0}
+        with self._lock:
+            for result in results:
+                custom_id = result.get("custom_id")
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    cursor = self._db.execute(
+                        "UPDATE requests SET response = ?, error = NULL WHERE custom_id = ?",
+                        (json.dumps(response["body"], ensure_ascii=False), custom_id))
+                    outcome = "succeeded"
+                else:
+                    error = result.get("error") or response.get("body") or "unknown error"
+                    cursor = self._db.execute(
+                        "UPDATE requests SET error = ?"
+                        " WHERE custom_id = ? AND response IS NULL",
+                        (json.dumps(error, ensure_ascii=False), custom_id))
+                    outcome = "failed"
+                counts[outcome if cursor.rowcount else "unknown"] += 1
+            self._db.commit()
+        return counts
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            videos = dict(self._db.execute(
+                "SELECT status, COUNT(*) FROM videos GROUP BY status").fetchall())
+            (requests, exported, answered, failed) = self._db.execute(
+                "SELECT COUNT(*), COUNT(round), COUNT(response),"
+                " SUM(error IS NOT NULL AND response IS NULL) FROM requests").fetchone()
+        return {
+            "videos_pending": videos.get(PENDING, 0),
+            "videos_done": videos.get(DONE, 0),
+            "videos_failed": videos.get(FAILED, 0),
+            "requests": requests,
+            "requests_exported": exported,
+            "requests_answered": answered,
+            "requests_failed": failed or 0,
+        }
+
+
+class BatchSession:
+    """
+    Stands in for the provider while one video runs through the pipeline (see
+    `utils.llm_cache.batch_session`): requests with an ingested result are
+    answered from the checkpoint, the others are recorded for the next export
+    and raise `BatchPending`.
+    """
+
+    def __init__(self, checkpoint: BatchCheckpoint, video_id: str):
+        self.checkpoint = checkpoint
+        self.video_id = video_id
+        self.pending = 0
+        self._lock = threading.Lock()
+
+    def complete(self, stage: str, params: Dict[str, Any]) -> ChatCompletion:
+        key = make_cache_key(params)
+        body = self.checkpoint.response(key)
+        if body is not None:
+            LLM_CALLS.labels(stage, "batch").inc()
+            return ChatCompletion.model_validate(body)
+
+        custom_id = self.checkpoint.record(self.video_id, stage, key, params)
+        with self._lock:
+            self.pending += 1
+        raise BatchPending(custom_id)
+
+
+def read_jsonl(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
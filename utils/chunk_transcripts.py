@@ -1,48 +1,116 @@
-def chunk_transcripts(transcripts):
-    """
-    Split a list of transcript entries into overlapping 20-minute chunks
-    with 5-minute overlap between consecutive chunks.
+import os
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple, Union
 
-    Each transcript entry should be a dict of the form:
-        {
-            "text": <str>,
-            "start": <float>,    # start time in seconds
-            "duration": <float>  # duration in seconds
-        }
+import tiktoken
+from dotenv import load_dotenv
 
-    Returns:
-        List of chunks, where each chunk is a list of transcript‐entry dicts.
+from utils.transcript import Transcript
+
+load_dotenv()
+
+ENCODING_NAME = "cl100k_base"
+# Token budget of a single window, measured with the same encoding as the LLM calls
+WINDOW_MAX_TOKENS = int(os.getenv("TRANSCRIPT_WINDOW_MAX_TOKENS", "8000"))
+# Approximate tokens each line spends on its timestamp and formatting in the prompt
+LINE_OVERHEAD_TOKENS = 12
+
+
+@lru_cache(maxsize=None)
+def _get_encoding():
+    return tiktoken.get_encoding(ENCODING_NAME)
+
+
+def _entry_token_counts(transcripts: Union[Transcript, List[Dict[str, float]]]) -> List[int]:
+    if isinstance(transcripts, Transcript):
+        texts = transcripts.texts()
+    else:
+        texts = [e.get("text", "") for e in transcripts]
+    encoded = _get_encoding().encode_ordinary_batch(texts)
+    return [len(tokens) + LINE_OVERHEAD_TOKENS for tokens in encoded]
+
+
+def chunk_transcript_ranges(
+    transcripts: Union[Transcript, List[Dict[str, float]]],
+    max_tokens: int = WINDOW_MAX_TOKENS,
+    overlap_tokens: Optional[int] = None,
+    overlap_seconds: Optional[float] = None,
+) -> List[Tuple[int, int]]:
+    """
+    Splits transcript entries (sorted by start time) into overlapping windows of
+    at most `max_tokens` tokens and returns them as [start, end) index ranges.
+
+    Consecutive windows overlap by `overlap_tokens` tokens, or by the entries
+    starting within `overlap_seconds` of the next window's first new entry.
+    Defaults to a quarter of the budget. An entry larger than the budget gets a
+    window of its own. Window boundaries are found by binary search over
+    cumulative token counts and start times, so the entries are scanned once.
     """
     if not transcripts:
         return []
+    if overlap_tokens is None and overlap_seconds is None:
+        overlap_tokens = max_tokens // 4
+    if overlap_tokens is not None and not 0 <= overlap_tokens < max_tokens:
+        raise ValueError("overlap_tokens must be in [0, max_tokens)")
+
+    # cumulative[i] is the number of tokens in transcripts[:i]
+    cumulative = [0] + list(accumulate(_entry_token_counts(transcripts)))
+    if isinstance(transcripts, Transcript):
+        starts = transcripts.starts
+    else:
+        starts = [e["start"] for e in transcripts]
+    n = len(transcripts)
 
-    # 1) Compute each entry's end time, and find the overall time span
-    for e in transcripts:
-        e["_end"] = e["start"] + e["duration"]
+    ranges = []
+    start = 0
+    while start < n:
+        end = bisect_right(cumulative, cumulative[start] + max_tokens, lo=start + 1) - 1
+        end = max(end, start + 1)
+        ranges.append((start, end))
+        if end >= n:
+            break
 
-    first_start = min(e["start"] for e in transcripts)
-    last_end = max(e["_end"] for e in transcripts)
+        if overlap_seconds is not None:
+            next_start = bisect_left(starts, starts[end] - overlap_seconds,
+                                     lo=start, hi=end)
+        else:
+            next_start = bisect_left(cumulative, cumulative[end] - overlap_tokens,
+                                     lo=start, hi=end)
+        start = max(next_start, start + 1)
 
-    # 2) Set chunk parameters (in seconds)
-    chunk_length = 20 * 60   # 20 minutes = 1200 seconds
-    step = 15 * 60   # advance by 15 minutes = 900 seconds
+    return ranges
 
-    chunks = []
-    current_start = first_start
 
-    # 3) Slide a 20-minute window, stepping every 15 minutes
-    while current_start < last_end:
-        current_end = current_start + chunk_length
+def chunk_transcripts(
+    transcripts: Union[Transcript, List[Dict[str, float]]],
+    max_tokens: int = WINDOW_MAX_TOKENS,
+    overlap_tokens: Optional[int] = None,
+    overlap_seconds: Optional[float] = None,
+) -> List[List[Dict[str, float]]]:
+    """
+    Split a list of transcript entries into overlapping windows sized by a
+    token budget (see `chunk_transcript_ranges`).
+
+    Each transcript entry should be a dict of the form:
+        {
+            "text": <str>,
+            "start": <float>,    # start time in seconds
+            "duration": <float>  # duration in seconds
+        }
 
-        # 4) Collect all entries whose start time falls within [current_start, current_end)
-        chunk_entries = [
-            # drop the internal "_end" key
-            {k: v for k, v in e.items() if k != "_end"}
-            for e in transcripts
-            if e["start"] >= current_start and e["start"] < current_end
-        ]
+    A `Transcript` is accepted as well and chunked into `Transcript` views.
 
-        chunks.append(chunk_entries)
-        current_start += step
+    Returns:
+        List of chunks, where each chunk is a list slice holding the original
+        entry dicts (entries are neither copied nor modified).
+    """
+    # Transcript instances are always sorted by start time
+    if not isinstance(transcripts, Transcript) and any(
+            a["start"] > b["start"] for a, b in zip(transcripts, transcripts[1:])):
+        transcripts = sorted(transcripts, key=lambda e: e["start"])
 
-    return chunks
+    return [transcripts[start:end]
+            for start, end in chunk_transcript_ranges(
+                transcripts, max_tokens, overlap_tokens, overlap_seconds)]
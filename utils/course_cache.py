@@ -0,0 +1,135 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+COURSE_CACHE_MAX_ENTRIES = int(os.getenv("COURSE_CACHE_MAX_ENTRIES", "128"))
+
+
+class CourseCache:
+    """
+    Bounded LRU cache of finished courses with single-flight deduplication:
+    while a key is being computed, other callers asking for the same key wait
+    for that computation instead of starting their own.
+
+    Failed or empty results are handed to the waiting callers but not cached.
+    """
+
+    def __init__(self, max_entries: int = COURSE_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+        self._results: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._in_flight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """
+        Returns the cached course for `key`, or None without computing it.
+        """
+        with self._lock:
+            if key not in self._results:
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return self._results[key]
+
+    def invalidate(self, key: Hashable) -> None:
+        """
+        Drops the cached course for `key`; a computation in flight is kept.
+        """
+        with self._lock:
+            self._results.pop(key, None)
+
+    def begin(self, key: Hashable) -> Tuple[Future, bool]:
+        """
+        Returns the future of the course for `key` and whether the caller owns
+        its computation. The owner must settle it with `complete` (or
+        `abandon`); everyone else only waits for the future, e.g. with
+        `asyncio.wrap_future` without holding a thread.
+        """
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                self.hits += 1
+                future = Future()
+                future.set_result(self._results[key])
+                return future, False
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.deduplicated += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            self.misses += 1
+            return future, True
+
+    def complete(self, key: Hashable, future: Future, compute: Callable[[], Any]) -> None:
+        """
+        Runs `compute` for a key owned through `begin` and settles its future
+        with the result or the error. Does nothing if another caller has
+        already taken the computation over (see `get_or_compute`).
+        """
+        with self._lock:
+            if future.running() or future.done():
+                return
+            if not future.set_running_or_notify_cancel():
+                self._in_flight.pop(key, None)
+                return
+
+        try:
+            result = compute()
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[key]
+            future.set_exception(e)
+            return
+
+        with self._lock:
+            del self._in_flight[key]
+            if result:
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+        future.set_result(result)
+
+    def abandon(self, key: Hashable, future: Future, error: BaseException) -> None:
+        """
+        Fails a key owned through `begin` whose computation never started, so
+        its waiters are not left hanging. Does nothing once it has started.
+        """
+        with self._lock:
+            if future.running() or future.done():
+                return
+            del self._in_flight[key]
+            future.set_exception(error)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Returns the course for `key`, computing it in the calling thread. A
+        computation whose owner has not started it yet (e.g. a request still
+        waiting for admission) is taken over, so a caller that already holds
+        a pipeline slot never waits for one that needs a slot too.
+        """
+        future, _ = self.begin(key)
+        self.complete(key, future, compute)
+        return future.result()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "deduplicated": self.deduplicated,
+                "entries": len(self._results),
+                "in_flight": len(self._in_flight),
+            }
+
+
+course_cache = CourseCache()
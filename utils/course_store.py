@@ -0,0 +1,246 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from utils.manifest import content_hash
+from utils.segments import Interval, format_segment
+from utils.transcript import Transcript
+
+load_dotenv()
+
+COURSE_STORE_ENABLED = os.getenv("COURSE_STORE_ENABLED", "true").lower() != "false"
+COURSE_STORE_PATH = os.getenv("COURSE_STORE_PATH", os.path.join(".cache", "courses.sqlite"))
+# Stored courses older than this are rebuilt, so transcript edits are picked up
+# even by requests that do not fetch the transcript; 0 keeps them forever
+COURSE_STORE_MAX_AGE_SECONDS = float(os.getenv("COURSE_STORE_MAX_AGE_SECONDS", str(7 * 24 * 3600)))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS courses (
+    video_id TEXT PRIMARY KEY,
+    transcript TEXT NOT NULL,
+    transcript_hash TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS points (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS points_video ON points (video_id, position);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    description TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS segments_video_time ON segments (video_id, start, end);
+
+-- Full-text indexes over the points and segment descriptions, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS points_fts USING fts5(
+    text, content='points', content_rowid='id');
+CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(
+    description, content='segments', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS points_ai AFTER INSERT ON points BEGIN
+    INSERT INTO points_fts (rowid, text) VALUES (new.id, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS points_ad AFTER DELETE ON points BEGIN
+    INSERT INTO points_fts (points_fts, rowid, text) VALUES ('delete', old.id, old.text);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ai AFTER INSERT ON segments BEGIN
+    INSERT INTO segments_fts (rowid, description) VALUES (new.id, new.description);
+END;
+CREATE TRIGGER IF NOT EXISTS segments_ad AFTER DELETE ON segments BEGIN
+    INSERT INTO segments_fts (segments_fts, rowid, description)
+    VALUES ('delete', old.id, old.description);
+END;
+"""
+
+
+def _match_query(query: str) -> str:
+    # Every word becomes a quoted FTS term, so user input cannot break the query
+    # syntax; any word may match and BM25 ranks results matching more words first
+    return " OR ".join(f'"{word}"' for word in re.findall(r"\w+", query))
+
+
+def _entries(transcript: Union[Transcript, Iterable[Dict[str, float]]]) -> List[Dict[str, Any]]:
+    return transcript.to_entries() if isinstance(transcript, Transcript) else list(transcript)
+
+
+def _segment(row) -> Dict[str, Any]:
+    start, end, description = row
+    return {"start": start, "end": end, "description": description,
+            "segment": format_segment((start, end, description))}
+
+
+class CourseStore:
+    """
+    SQLite store of finished courses: the transcript, instructional points and
+    segments (as numeric intervals) of every video, indexed by video and time
+    range, with full-text search over the points and segment descriptions.
+    Each video keeps its latest course only.
+
+    A course is only served again while it is current: built with the same
+    pipeline `fingerprint` (prompt versions, prompt and filter settings,
+    models), from the same transcript when the caller has it, and no older
+    than `max_age` seconds.
+    """
+
+    def __init__(self, path: Optional[str] = COURSE_STORE_PATH,
+                 max_age: float = COURSE_STORE_MAX_AGE_SECONDS):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.executescript(_SCHEMA)
+            self._db.commit()
+
+    def save(self, video_id: str, transcript: Union[Transcript, Iterable[Dict[str, float]]],
+             points: List[str], intervals: List[Interval], fingerprint: str) -> None:
+        """
+        Stores the course of a video built with the pipeline `fingerprint`,
+        replacing its previous one.
+        """
+        if self._db is None:
+            return
+        entries = _entries(transcript)
+        now = time.time()
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM points WHERE video_id = ?", (video_id,))
+            self._db.execute("DELETE FROM segments WHERE video_id = ?", (video_id,))
+            self._db.executemany(
+                "INSERT INTO points (video_id, position, text) VALUES (?, ?, ?)",
+                [(video_id, position, str(point)) for position, point in enumerate(points)])
+            self._db.executemany(
+                "INSERT INTO segments (video_id, start, end, description) VALUES (?, ?, ?, ?)",
+                [(video_id, start, end, description) for start, end, description in intervals])
+            self._db.execute(
+                "INSERT INTO courses (video_id, transcript, transcript_hash, fingerprint,"
+                " created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (video_id) DO UPDATE SET transcript = excluded.transcript,"
+                " transcript_hash = excluded.transcript_hash,"
+                " fingerprint = excluded.fingerprint, updated_at = excluded.updated_at",
+                (video_id, json.dumps(entries, ensure_ascii=False), content_hash(entries),
+                 fingerprint, now, now))
+
+    def segments(self, video_id: str, fingerprint: str,
+                 transcript: Union[Transcript, Iterable[Dict[str, float]], None] = None
+                 ) -> Optional[List[str]]:
+        """
+        The formatted segments of a video's stored course, or None when there
+        is none or it is not current (see the class docstring). `transcript`
+        is compared when given.
+        """
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT fingerprint, transcript_hash, updated_at FROM courses"
+                " WHERE video_id = ?", (video_id,)).fetchone()
+            if row is None or row[0] != fingerprint:
+                return None
+            if self.max_age > 0 and time.time() - row[2] > self.max_age:
+                return None
+            if transcript is not None and row[1] != content_hash(_entries(transcript)):
+                return None
+            rows = self._db.execute(
+                "SELECT start, end, description FROM segments WHERE video_id = ?"
+                " ORDER BY start", (video_id,)).fetchall()
+        return [format_segment(row) for row in rows]
+
+    def get(self, video_id: str, include_transcript: bool = False) -> Optional[Dict[str, Any]]:
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT transcript, created_at, updated_at FROM courses WHERE video_id = ?",
+                (video_id,)).fetchone()
+            if row is None:
+                return None
+            points = self._db.execute(
+                "SELECT text FROM points WHERE video_id = ? ORDER BY position",
+                (video_id,)).fetchall()
+            segments = self._db.execute(
+                "SELECT start, end, description FROM segments WHERE video_id = ?"
+                " ORDER BY start", (video_id,)).fetchall()
+        course = {
+            "video_id": video_id,
+            "points": [point for point, in points],
+            "segments": [_segment(segment) for segment in segments],
+            "created_at": row[1],
+            "updated_at": row[2],
+        }
+        if include_transcript:
+            course["transcript"] = json.loads(row[0])
+        return course
+
+    def segments_in_range(self, video_id: str, start: float,
+                          end: float) -> Optional[List[Dict[str, Any]]]:
+        """
+        The stored segments of a video that overlap [start, end], or None when
+        the video has no stored course.
+        """
+        if self._db is None:
+            return None
+        with self._lock:
+            if self._db.execute("SELECT 1 FROM courses WHERE video_id = ?",
+                                (video_id,)).fetchone() is None:
+                return None
+            rows = self._db.execute(
+                "SELECT start, end, description FROM segments"
+                " WHERE video_id = ? AND start <= ? AND end >= ? ORDER BY start",
+                (video_id, end, start)).fetchall()
+        return [_segment(row) for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Searches the points and segment descriptions of all stored courses and
+        returns the best `limit` matches, best first.
+        """
+        match = _match_query(query)
+        if self._db is None or not match:
+            return []
+        with self._lock:
+            segments = self._db.execute(
+                "SELECT s.video_id, s.start, s.end, s.description, segments_fts.rank"
+                " FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid"
+                " WHERE segments_fts MATCH ? ORDER BY segments_fts.rank LIMIT ?",
+                (match, limit)).fetchall()
+            points = self._db.execute(
+                "SELECT p.video_id, p.text, points_fts.rank"
+                " FROM points_fts JOIN points p ON p.id = points_fts.rowid"
+                " WHERE points_fts MATCH ? ORDER BY points_fts.rank LIMIT ?",
+                (match, limit)).fetchall()
+
+        # FTS5 ranks are BM25 scores where lower is better
+        results = [(rank, {"type": "segment", "video_id": video_id,
+                           **_segment((start, end, description))})
+                   for video_id, start, end, description, rank in segments]
+        results += [(rank, {"type": "point", "video_id": video_id, "point": text})
+                    for video_id, text, rank in points]
+        results.sort(key=lambda result: result[0])
+        return [result for _, result in results[:limit]]
+
+    def stats(self) -> Dict[str, int]:
+        if self._db is None:
+            return {"courses": 0, "segments": 0}
+        with self._lock:
+            courses, = self._db.execute("SELECT COUNT(*) FROM courses").fetchone()
+            segments, = self._db.execute("SELECT COUNT(*) FROM segments").fetchone()
+        return {"courses": courses, "segments": segments}
+
+
+course_store = CourseStore(COURSE_STORE_PATH if COURSE_STORE_ENABLED else None)
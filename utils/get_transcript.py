@@ -1,11 +1,16 @@
-from typing import List, Dict, Union
+from typing import Iterable, List, Dict, Union
 from datetime import datetime
-import requests
+import asyncio
 import re
 import os
 from typing import List, Dict
 from dotenv import load_dotenv
 
+from utils.metrics import track_stage
+from utils.subtitles import iter_subtitle_entries
+from utils.transcript import Transcript
+from utils.transcript_service import TranscriptError, transcript_fetcher
+
 load_dotenv()
 
 
@@ -21,56 +26,35 @@ def _extract_video_id(video_id_or_url: str) -> str:
     return video_id_or_url
 
 
+def read_video_ids(path: str) -> List[str]:
+    """
+    خواندن شناسه‌ها یا لینک‌های ویدیو از فایل (هر خط یکی؛ خطوط خالی و # نادیده گرفته می‌شوند)
+    """
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f
+                if line.strip() and not line.lstrip().startswith("#")]
+
+
 def _parse_srt_file(file_path: str) -> List[Dict[str, int]]:
     """
-    پردازش فایل SRT و استخراج متن با زمان شروع و مدت‌زمان (بر حسب ثانیه، به صورت عدد صحیح)
+    پردازش فایل SRT (یا WebVTT) و استخراج متن با زمان شروع و مدت‌زمان (بر حسب ثانیه)
     """
-    def _time_str_to_seconds(time_str: str) -> float:
-        """
-        تبدیل رشته زمان SRT (فرمت "HH:MM:SS,mmm") به تعداد ثانیه (به صورت float)
-        """
-        hours, minutes, rest = time_str.split(':')
-        seconds, milliseconds = rest.split(',')
-        total_seconds = (
-            int(hours) * 3600 +
-            int(minutes) * 60 +
-            int(seconds) +
-            int(milliseconds) / 1000.0
-        )
-        return total_seconds
-
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-
-    transcripts: List[Dict[str, int]] = []
-    blocks = content.strip().split('\n\n')
-
-    for block in blocks:
-        lines = block.split('\n')
-        if len(lines) >= 3:
-            time_line = lines[1]
-            text = ' '.join(lines[2:])
-
-            start_str, end_str = time_line.split(' --> ')
-            start_seconds = _time_str_to_seconds(start_str.strip())
-            end_seconds = _time_str_to_seconds(end_str.strip())
-
-            # گرد کردن زمان‌ها به ثانیه
-            start_seconds_rounded = round(start_seconds, 3)
-            duration_seconds = round(end_seconds - start_seconds, 3)
-
-            transcripts.append({
-                'text': text,
-                'start': start_seconds_rounded,
-                'duration': duration_seconds
-            })
-
-    return transcripts
-
-
-def get_transcript(video_url_or_id: str) -> List[Dict[str, str]]:
+    return list(iter_subtitle_entries(file_path))
+
+
+def _load_sample_transcript() -> Transcript:
+    sample_file = os.path.join(os.path.dirname(
+        __file__), "..", "samples", "sample-transcript.srt")
+
+    if not os.path.exists(sample_file):
+        raise FileNotFoundError(f"فایل نمونه {sample_file} یافت نشد.")
+
+    return Transcript.from_entries(iter_subtitle_entries(sample_file))
+
+
+def get_transcript(video_url_or_id: str) -> Transcript:
     """
-    دریافت ترنسکرایپت با فرمت:
+    دریافت ترنسکرایپت به صورت یک Transcript ستونی با ورودی‌هایی به فرمت:
     [
         {
             "text": "متن زیرنویس",
@@ -79,36 +63,52 @@ def get_transcript(video_url_or_id: str) -> List[Dict[str, str]]:
         },
         ...
     ]
+
+    در صورت نبود ترنسکرایپت TranscriptNotFoundError و در صورت در دسترس نبودن
+    سرویس TranscriptServiceError رخ می‌دهد.
     """
     environment = os.getenv("ENVIRONMENT")
-    if environment == "development":
-        sample_file = os.path.join(os.path.dirname(
-            __file__), "..", "samples", "sample-transcript.srt")
-
-        if not os.path.exists(sample_file):
-            raise FileNotFoundError(f"فایل نمونه {sample_file} یافت نشد.")
-
-        return _parse_srt_file(sample_file)
-
-    else:
-        try:
-            video_id = _extract_video_id(video_url_or_id)
-            youtube_transcription_service_url = os.getenv(
-                "YOUTUBE_TRANSCRIPT_SERVICE_URL")
-            api_url = f"{youtube_transcription_service_url}/transcript?video={video_id}"
-            response = requests.get(api_url)
-            response.raise_for_status()
-
-            transcript = response.json()
-            formatted_transcript = []
-            for item in transcript:
-                formatted_transcript.append({
-                    'text': item['text'],
-                    'start': item['start'],
-                    'duration': item['duration']
-                })
-            return formatted_transcript
-
-        except Exception as e:
-            print(f"Error while fetching transcript: {e}")
-            return []
+    with track_stage("transcript_fetch"):
+        if environment == "development":
+            return _load_sample_transcript()
+
+        video_id = _extract_video_id(video_url_or_id)
+        return transcript_fetcher.fetch(video_id)
+
+
+async def aget_transcript(video_url_or_id: str) -> Transcript:
+    """
+    نسخه‌ی async تابع get_transcript برای استفاده در handlerهای FastAPI
+    """
+    environment = os.getenv("ENVIRONMENT")
+    with track_stage("transcript_fetch"):
+        if environment == "development":
+            return await asyncio.to_thread(_load_sample_transcript)
+
+        video_id = _extract_video_id(video_url_or_id)
+        return await transcript_fetcher.afetch(video_id)
+
+
+def get_transcripts(video_ids: Iterable[str]) -> Dict[str, Union[Transcript, TranscriptError]]:
+    """
+    دریافت گروهی ترنسکرایپت چند ویدیو به صورت همزمان. خروجی نگاشتی از شناسه‌ی
+    ویدیو به Transcript یا خطای مربوط به همان ویدیو است.
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    with track_stage("transcript_fetch_many"):
+        if os.getenv("ENVIRONMENT") == "development":
+            sample = _load_sample_transcript()
+            return {video_id: sample for video_id in video_ids}
+        return transcript_fetcher.fetch_many(video_ids)
+
+
+async def aget_transcripts(video_ids: Iterable[str]) -> Dict[str, Union[Transcript, TranscriptError]]:
+    """
+    نسخه‌ی async تابع get_transcripts
+    """
+    video_ids = list(dict.fromkeys(video_ids))
+    with track_stage("transcript_fetch_many"):
+        if os.getenv("ENVIRONMENT") == "development":
+            sample = await asyncio.to_thread(_load_sample_transcript)
+            return {video_id: sample for video_id in video_ids}
+        return await transcript_fetcher.afetch_many(video_ids)
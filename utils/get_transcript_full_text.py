@@ -1,7 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Union
 
+from utils.transcript import Transcript
 
-def extract_transcript_text(transcript: List[Dict[str, float]]) -> str:
+
+def extract_transcript_text(transcript: Union[Transcript, List[Dict[str, float]]]) -> str:
     """
     دریافت تمام متن‌ها از یک ترنسکرایپت و ادغام آن‌ها در یک رشته واحد.
 
@@ -19,6 +21,9 @@ def extract_transcript_text(transcript: List[Dict[str, float]]) -> str:
     خروجی:
         یک رشته حاوی تمام مقادیر “text” به ترتیب، جدا شده با فاصله.
     """
+    if isinstance(transcript, Transcript):
+        return transcript.full_text()
+
     # جمع‌آوری تکست‌ها در یک لیست
     texts = [item["text"] for item in transcript if "text" in item]
 
@@ -0,0 +1,325 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(".cache", "jobs.sqlite"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Finished jobs kept by the in-memory store; the oldest are evicted first
+JOB_STORE_MAX_FINISHED = int(os.getenv("JOB_STORE_MAX_FINISHED", "1000"))
+# A running SQLite job whose worker has not renewed its lease for this long
+# (e.g. its process died) is put back in the queue
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _new_job(video_id: str) -> Dict[str, Any]:
+    now = time.time()
+    return {
+        "id": uuid.uuid4().hex,
+        "video_id": video_id,
+        "status": QUEUED,
+        "stage": None,
+        "progress": {},
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _with_progress(job: Dict[str, Any], stage: str,
+                   completed: int, total: int) -> Dict[str, Any]:
+    progress = dict(job["progress"])
+    progress[stage] = {"completed": completed, "total": total}
+    return {"stage": stage, "progress": progress}
+
+
+class InMemoryJobQueue:
+    """
+    Job queue and job store that live in the current process. Only the latest
+    `max_finished` finished jobs are kept.
+    """
+
+    def __init__(self, max_finished: int = JOB_STORE_MAX_FINISHED):
+        self.max_finished = max_finished
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+
+    def submit(self, video_id: str) -> Dict[str, Any]:
+        job = _new_job(video_id)
+        with self._lock:
+            self._jobs[job["id"]] = job
+        self._queue.put(job["id"])
+        return dict(job)
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        try:
+            job_id = self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        return self.update(job_id, status=RUNNING)
+
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(fields, updated_at=time.time())
+            if job["status"] in (SUCCEEDED, FAILED):
+                self._finished[job_id] = None
+                while len(self._finished) > self.max_finished:
+                    evicted, _ = self._finished.popitem(last=False)
+                    del self._jobs[evicted]
+            return dict(job)
+
+    def heartbeat(self, job_id: str) -> None:
+        # Jobs cannot outlive this process, so there is no lease to renew
+        pass
+
+    def report_progress(self, job_id: str, stage: str,
+                        completed: int, total: int) -> None:
+        with self._lock:
+            job = self._jobs[job_id]
+            job.update(_with_progress(job, stage, completed, total),
+                       updated_at=time.time())
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+
+class SQLiteJobQueue:
+    """
+    Persistent job queue backed by a local SQLite file, which several
+    processes may share. A job is claimed atomically and held with a lease
+    that its worker renews (`heartbeat`); jobs whose lease expired, e.g.
+    because their process stopped, are put back in the queue.
+    """
+
+    _COLUMNS = ("id", "video_id", "status", "stage", "progress",
+                "result", "error", "created_at", "updated_at")
+    _JSON_COLUMNS = ("progress", "result")
+
+    def __init__(self, path: str = JOB_QUEUE_PATH, poll_interval: float = 0.5,
+                 lease_seconds: float = JOB_LEASE_SECONDS):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._submitted = threading.Condition(self._lock)
+        # Autocommit mode; claims open their own BEGIN IMMEDIATE transaction
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " video_id TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " stage TEXT,"
+            " progress TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        if "lease_expires_at" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status_created_at"
+            " ON jobs (status, created_at)")
+
+    def _to_row(self, job: Dict[str, Any]) -> List[Any]:
+        return [json.dumps(job[c]) if c in self._JSON_COLUMNS else job[c]
+                for c in self._COLUMNS]
+
+    def _from_row(self, row) -> Dict[str, Any]:
+        job = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] else None
+        return job
+
+    def _get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._db.execute(
+            f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?",
+            (job_id,)).fetchone()
+        return self._from_row(row) if row is not None else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> None:
+        fields = dict(fields, updated_at=time.time())
+        assignments = ", ".join(f"{c} = ?" for c in fields)
+        values = [json.dumps(v) if c in self._JSON_COLUMNS else v
+                  for c, v in fields.items()]
+        self._db.execute(f"UPDATE jobs SET {assignments} WHERE id = ?",
+                         values + [job_id])
+
+    def submit(self, video_id: str) -> Dict[str, Any]:
+        job = _new_job(video_id)
+        with self._lock:
+            self._db.execute(
+                f"INSERT INTO jobs ({', '.join(self._COLUMNS)})"
+                f" VALUES ({', '.join('?' for _ in self._COLUMNS)})",
+                self._to_row(job))
+            self._submitted.notify()
+        return job
+
+    def _claim_next(self) -> Optional[str]:
+        """
+        Requeues the jobs with an expired lease and claims the oldest queued
+        job, in one write transaction so that no other process can claim it too.
+        """
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, updated_at = ? WHERE status = ?"
+                " AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (QUEUED, now, RUNNING, now))
+            row = self._db.execute(
+                "SELECT id FROM jobs WHERE status = ?"
+                " ORDER BY created_at LIMIT 1", (QUEUED,)).fetchone()
+            claimed = row is not None and self._db.execute(
+                "UPDATE jobs SET status = ?, lease_expires_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (RUNNING, now + self.lease_seconds, now, row[0], QUEUED)).rowcount == 1
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return row[0] if claimed else None
+
+    def claim(self, timeout: float = 1.0) -> Optional[Dict[str, Any]]:
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                job_id = self._claim_next()
+                if job_id is not None:
+                    return self._get(job_id)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                # Also polls, so jobs submitted by other processes get picked up
+                self._submitted.wait(min(remaining, self.poll_interval))
+
+    def update(self, job_id: str, **fields) -> Dict[str, Any]:
+        with self._lock:
+            self._update(job_id, fields)
+            return self._get(job_id)
+
+    def report_progress(self, job_id: str, stage: str,
+                        completed: int, total: int) -> None:
+        with self._lock:
+            job = self._get(job_id)
+            self._update(job_id, _with_progress(job, stage, completed, total))
+
+    def heartbeat(self, job_id: str) -> None:
+        """
+        Renews the lease of a running job.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ?",
+                (time.time() + self.lease_seconds, job_id, RUNNING))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._get(job_id)
+
+
+def create_job_queue(backend: str = JOB_QUEUE_BACKEND):
+    if backend == "memory":
+        return InMemoryJobQueue()
+    if backend == "sqlite":
+        return SQLiteJobQueue()
+    raise ValueError(f"Unknown job queue backend: {backend}")
+
+
+# Called with (video_id, on_progress) and returns the job result
+JobHandler = Callable[[str, Callable[[str, int, int], None]], Any]
+
+
+class JobWorkerPool:
+    """
+    Background threads that pull jobs from a queue and run them with `handler`.
+    The number of workers bounds how many pipelines run at the same time. The
+    leases of the running jobs are renewed every third of JOB_LEASE_SECONDS.
+    """
+
+    def __init__(self, job_queue, handler: JobHandler,
+                 concurrency: int = JOB_WORKERS,
+                 heartbeat_interval: float = JOB_LEASE_SECONDS / 3):
+        self.job_queue = job_queue
+        self.handler = handler
+        self.concurrency = concurrency
+        self.heartbeat_interval = heartbeat_interval
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._running: Dict[str, None] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        self._stopping.clear()
+        for idx in range(self.concurrency):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{idx}",
+                                      daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _heartbeat(self) -> None:
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._running_lock:
+                job_ids = list(self._running)
+            for job_id in job_ids:
+                try:
+                    self.job_queue.heartbeat(job_id)
+                except Exception as e:
+                    print(f"Error while renewing the lease of job {job_id}: {e}")
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            job = self.job_queue.claim(timeout=0.5)
+            if job is None:
+                continue
+
+            def on_progress(stage: str, completed: int, total: int,
+                            job_id: str = job["id"]):
+                self.job_queue.report_progress(job_id, stage, completed, total)
+
+            with self._running_lock:
+                self._running[job["id"]] = None
+            try:
+                result = self.handler(job["video_id"], on_progress)
+            except Exception as e:
+                print(f"Error while running job {job['id']}: {e}")
+                self.job_queue.update(job["id"], status=FAILED, error=str(e))
+            else:
+                self.job_queue.update(job["id"], status=SUCCEEDED, result=result)
+            finally:
+                with self._running_lock:
+                    self._running.pop(job["id"], None)
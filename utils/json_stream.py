@@ -0,0 +1,87 @@
+import json
+from typing import Any, List, Optional
+
+
+class JSONArrayStream:
+    """
+    Incremental parser for streamed JSON such as `{"segments": [{...}, {...}]}`:
+    text is fed as it arrives and every element of the array under `key` (of
+    the top-level object, or the top-level array when `key` is None) is
+    returned as soon as it is complete.
+    """
+
+    def __init__(self, key: Optional[str] = None):
+        self.key = key
+        self.finished = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string: List[str] = []
+        self._last_key: Optional[str] = None
+        # Depth of the target array's elements once its "[" has been seen
+        self._array_depth: Optional[int] = None
+        self._item: List[str] = []
+        self._item_kind: Optional[str] = None  # "container", "string" or "scalar"
+
+    def _at_items(self) -> bool:
+        return not self.finished and self._depth == self._array_depth
+
+    def _emit(self, items: List[Any], text: str) -> None:
+        self._item, self._item_kind = [], None
+        try:
+            items.append(json.loads(text))
+        except json.JSONDecodeError:
+            pass
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Consumes the next piece of the response and returns the elements it completed.
+        """
+        items: List[Any] = []
+        for ch in text:
+            if self._item_kind is not None:
+                self._item.append(ch)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._last_key = "".join(self._string)
+                    if self._item_kind == "string" and self._at_items():
+                        self._emit(items, "".join(self._item))
+                elif self._depth == 1:
+                    self._string.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string = []
+                if self._item_kind is None and self._at_items():
+                    self._item, self._item_kind = [ch], "string"
+            elif ch in "{[":
+                if self._item_kind is None and self._at_items():
+                    self._item, self._item_kind = [ch], "container"
+                self._depth += 1
+                if (ch == "[" and self._array_depth is None
+                        and ((self.key is None and self._depth == 1)
+                             or (self.key is not None and self._depth == 2
+                                 and self._last_key == self.key))):
+                    self._array_depth = self._depth
+            elif ch in "}]":
+                self._depth -= 1
+                if self._item_kind == "scalar" and self._depth + 1 == self._array_depth:
+                    self._emit(items, "".join(self._item[:-1]))
+                if self._array_depth is not None and self._depth < self._array_depth:
+                    self.finished = True
+                elif self._item_kind == "container" and self._at_items():
+                    self._emit(items, "".join(self._item))
+            elif ch == ",":
+                if self._item_kind == "scalar" and self._at_items():
+                    self._emit(items, "".join(self._item[:-1]))
+            elif not ch.isspace() and self._item_kind is None and self._at_items():
+                self._item, self._item_kind = [ch], "scalar"
+        return items
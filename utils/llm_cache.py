@@ -0,0 +1,297 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from openai.types.chat import ChatCompletion
+
+from utils.json_stream import JSONArrayStream
+from utils.llm_scheduler import llm_scheduler
+from utils.metrics import LLM_CALL_LATENCY, LLM_CALLS, LLM_TIME_TO_FIRST_ITEM, record_llm_usage
+from utils.model_routing import note_usage
+
+load_dotenv()
+
+CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() != "false"
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite"))
+CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+CACHE_DISK_ENTRIES = int(os.getenv("LLM_CACHE_DISK_ENTRIES", "10000"))
+# 0 disables expiry
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+
+
+# Set while preparing Batch API requests (see utils.batch); follows the context
+# into worker threads like the LLM priority
+_batch_session: ContextVar[Optional[Any]] = ContextVar("llm_batch_session", default=None)
+
+
+@contextmanager
+def batch_session(session):
+    """
+    Routes every chat completion of the wrapped block to `session.complete`
+    instead of the provider.
+    """
+    token = _batch_session.set(session)
+    try:
+        yield
+    finally:
+        _batch_session.reset(token)
+
+
+def make_cache_key(params: Dict[str, Any]) -> str:
+    """
+    Returns a content hash of a chat completion request (model, messages and
+    generation params). Keys are sorted so equivalent requests hash the same.
+    """
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Two-level cache for chat completion responses: an in-memory LRU in front of
+    a SQLite store. Disk entries are evicted by TTL and, once the store grows past
+    `max_disk_entries`, least recently used first.
+    """
+
+    def __init__(self, path: Optional[str] = CACHE_PATH,
+                 max_memory_entries: int = CACHE_MEMORY_ENTRIES,
+                 max_disk_entries: int = CACHE_DISK_ENTRIES,
+                 ttl_seconds: float = CACHE_TTL_SECONDS):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self._memory: "OrderedDict[str, tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            self._db.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at"
+                " ON responses (accessed_at)")
+            self._db.commit()
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM responses WHERE key = ?",
+                    (key,)).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if self._expired(created_at, now):
+                        self._db.execute(
+                            "DELETE FROM responses WHERE key = ?", (key,))
+                    else:
+                        self._db.execute(
+                            "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                            (now, key))
+                        self._remember(key, created_at, value)
+                        self._db.commit()
+                        self.hits += 1
+                        self.disk_hits += 1
+                        return value
+                    self._db.commit()
+
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)", (key, value, now, now))
+            if self.ttl_seconds > 0:
+                self._db.execute("DELETE FROM responses WHERE created_at < ?",
+                                 (now - self.ttl_seconds,))
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_disk_entries:
+                self._db.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses ORDER BY accessed_at LIMIT ?)",
+                    (count - self.max_disk_entries,))
+            self._db.commit()
+
+    def _remember(self, key: str, created_at: float, value: str) -> None:
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+            }
+
+
+# Shared by every module that talks to the LLM
+llm_cache = LLMCache(CACHE_PATH if CACHE_ENABLED else None)
+
+
+def _create_chat_completion(client, stage: str, params: Dict[str, Any],
+                            call: Optional[Callable[[], ChatCompletion]] = None) -> ChatCompletion:
+    if call is None:
+        def call():
+            start = time.perf_counter()
+            response = client.chat.completions.create(**params)
+            LLM_CALL_LATENCY.labels(stage).observe(time.perf_counter() - start)
+            return response
+
+    # Every call that reaches the provider goes through the shared scheduler
+    response = llm_scheduler.submit(call, params)
+    LLM_CALLS.labels(stage, "network").inc()
+    record_llm_usage(stage, response)
+    note_usage(response)
+    return response
+
+
+def cached_chat_completion(client, stage: str = "llm", **params) -> ChatCompletion:
+    """
+    Drop-in replacement for `client.chat.completions.create(**params)` that
+    serves deterministic (temperature 0) requests from the shared cache.
+    `stage` labels the call in the metrics.
+    """
+    session = _batch_session.get()
+    if session is not None:
+        return session.complete(stage, params)
+
+    if not CACHE_ENABLED or params.get("temperature") != 0:
+        return _create_chat_completion(client, stage, params)
+
+    key = make_cache_key(params)
+    cached = llm_cache.get(key)
+    if cached is not None:
+        LLM_CALLS.labels(stage, "cache").inc()
+        return ChatCompletion.model_validate_json(cached)
+
+    response = _create_chat_completion(client, stage, params)
+    llm_cache.set(key, response.model_dump_json())
+    return response
+
+
+def _emit_json_items(response: ChatCompletion, item_key: str,
+                     on_item: Callable[[Any], None]) -> None:
+    for item in JSONArrayStream(item_key).feed(response.choices[0].message.content or ""):
+        on_item(item)
+
+
+def streamed_json_completion(client, stage: str, item_key: str,
+                             on_item: Callable[[Any], None], **params) -> ChatCompletion:
+    """
+    Like `cached_chat_completion` for requests whose answer is a JSON object
+    holding an array under `item_key`, e.g. {"segments": [...]}. The completion
+    is streamed and `on_item` is called with every array element as soon as it
+    has been parsed, long before the response ends. Returns the assembled
+    completion, which is cached like any other.
+
+    Cached and batch answers are passed to `on_item` all at once. When a
+    stream fails and is retried, elements already passed on are not repeated.
+    """
+    session = _batch_session.get()
+    if session is not None:
+        response = session.complete(stage, params)
+        _emit_json_items(response, item_key, on_item)
+        return response
+
+    cacheable = CACHE_ENABLED and params.get("temperature") == 0
+    if cacheable:
+        key = make_cache_key(params)
+        cached = llm_cache.get(key)
+        if cached is not None:
+            LLM_CALLS.labels(stage, "cache").inc()
+            response = ChatCompletion.model_validate_json(cached)
+            _emit_json_items(response, item_key, on_item)
+            return response
+
+    emitted = 0
+
+    def call():
+        nonlocal emitted
+        parser = JSONArrayStream(item_key)
+        parsed = 0
+        parts, usage, finish_reason, first, last = [], None, "stop", None, None
+        start = time.perf_counter()
+        stream = client.chat.completions.create(
+            **params, stream=True, stream_options={"include_usage": True})
+        for chunk in stream:
+            last = chunk
+            if chunk.usage is not None:
+                usage = chunk.usage.model_dump()
+            for choice in chunk.choices:
+                finish_reason = choice.finish_reason or finish_reason
+                delta = choice.delta.content or ""
+                parts.append(delta)
+                for item in parser.feed(delta):
+                    parsed += 1
+                    if parsed <= emitted:
+                        continue
+                    if first is None:
+                        first = time.perf_counter() - start
+                        LLM_TIME_TO_FIRST_ITEM.labels(stage).observe(first)
+                    emitted += 1
+                    on_item(item)
+        LLM_CALL_LATENCY.labels(stage).observe(time.perf_counter() - start)
+        return ChatCompletion.model_validate({
+            "id": last.id if last else "",
+            "object": "chat.completion",
+            "created": last.created if last else int(time.time()),
+            "model": last.model if last else params.get("model", ""),
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": "".join(parts)}}],
+            "usage": usage,
+        })
+
+    response = _create_chat_completion(client, stage, params, call)
+    if cacheable:
+        llm_cache.set(key, response.model_dump_json())
+    return response
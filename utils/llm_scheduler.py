@@ -0,0 +1,230 @@
+import heapq
+import itertools
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Optional
+
+import openai
+import tiktoken
+from dotenv import load_dotenv
+
+from utils.metrics import LLM_CONCURRENCY_LIMIT, LLM_QUEUE_DEPTH, RETRIES
+
+load_dotenv()
+
+LLM_MAX_RPM = float(os.getenv("LLM_MAX_RPM", "500"))
+LLM_MAX_TPM = float(os.getenv("LLM_MAX_TPM", "150000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+# Calls slower than this are treated as a sign of provider congestion
+LLM_LATENCY_TARGET_SECONDS = float(os.getenv("LLM_LATENCY_TARGET_SECONDS", "60"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_RETRY_BACKOFF = float(os.getenv("LLM_RETRY_BACKOFF", "1.0"))
+
+# Lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError,
+                    openai.APITimeoutError, openai.InternalServerError)
+
+_priority: ContextVar[int] = ContextVar("llm_priority", default=PRIORITY_INTERACTIVE)
+
+
+@contextmanager
+def llm_priority(priority: int):
+    """
+    Runs the wrapped block with the given LLM scheduling priority. The priority
+    follows the context, so worker threads must be started with a copy of it
+    (`contextvars.copy_context().run`).
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def estimate_tokens(params: Dict[str, Any]) -> int:
+    """
+    Estimates the tokens a chat completion request counts against the provider's
+    TPM limit: prompt tokens measured with tiktoken plus the completion budget.
+    """
+    encoding = tiktoken.get_encoding("cl100k_base")
+    prompt_tokens = sum(
+        len(encoding.encode_ordinary(m.get("content") or "")) + 4
+        for m in params.get("messages", []))
+    return prompt_tokens + int(params.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute. Units
+    are reserved up front; `reserve` returns how long the caller has to wait
+    until its reservation is covered.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self._tokens = per_minute
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity,
+                           self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self._tokens -= min(amount, self.capacity)
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class LLMScheduler:
+    """
+    Process-wide gate for chat completion calls.
+
+    - Request and token rates are limited with token buckets (RPM/TPM), using a
+      tiktoken estimate that is corrected with the real usage afterwards.
+    - The number of calls in flight adapts AIMD-style: it grows by one per
+      "window" of successful calls, is halved on 429 responses and shrinks
+      when latency goes over the target.
+    - Waiting calls are served by priority, then in arrival order.
+    - Rate limits, timeouts, connection errors and 5xx responses are retried
+      with jittered exponential backoff (honoring Retry-After).
+    """
+
+    def __init__(self, max_rpm: float = LLM_MAX_RPM, max_tpm: float = LLM_MAX_TPM,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 latency_target: float = LLM_LATENCY_TARGET_SECONDS,
+                 max_retries: int = LLM_MAX_RETRIES,
+                 backoff: float = LLM_RETRY_BACKOFF):
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._requests = TokenBucket(max_rpm)
+        self._tokens = TokenBucket(max_tpm)
+        self._limit = float(max_concurrency)
+        self._in_flight = 0
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        LLM_CONCURRENCY_LIMIT.set(self._limit)
+
+    @property
+    def concurrency_limit(self) -> int:
+        return max(1, int(self._limit))
+
+    def _acquire_slot(self, priority: int, estimated: int) -> None:
+        """
+        Waits until the call is at the head of the queue, its request and token
+        reservation is covered and a concurrency slot is free. Only the head
+        reserves from the buckets, so a call waiting for the rate limits keeps
+        its place in the queue instead of a slot, and higher-priority calls
+        that arrive meanwhile still go first.
+        """
+        ticket = (priority, next(self._sequence))
+        ready_at = None
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            LLM_QUEUE_DEPTH.set(len(self._waiting))
+            while True:
+                if self._waiting[0] != ticket:
+                    self._condition.wait()
+                    continue
+                if ready_at is None:
+                    # A call that is overtaken later keeps its reservation
+                    ready_at = time.monotonic() + max(
+                        self._requests.reserve(1), self._tokens.reserve(estimated))
+                wait = ready_at - time.monotonic()
+                if wait <= 0 and self._in_flight < self.concurrency_limit:
+                    break
+                self._condition.wait(wait if wait > 0 else None)
+            heapq.heappop(self._waiting)
+            LLM_QUEUE_DEPTH.set(len(self._waiting))
+            self._in_flight += 1
+            self._condition.notify_all()
+
+    def _release_slot(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _adjust_limit(self, limit: float) -> None:
+        with self._condition:
+            self._limit = min(float(self.max_concurrency), max(1.0, limit))
+            LLM_CONCURRENCY_LIMIT.set(self._limit)
+            self._condition.notify_all()
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def submit(self, call: Callable[[], Any], params: Dict[str, Any],
+               priority: Optional[int] = None) -> Any:
+        """
+        Runs `call` (a chat completion request built from `params`) once the
+        rate limits, the concurrency limit and higher-priority calls allow it.
+        """
+        if priority is None:
+            priority = _priority.get()
+        estimated = estimate_tokens(params)
+
+        for attempt in itertools.count():
+            self._acquire_slot(priority, estimated)
+            try:
+                start = time.perf_counter()
+                try:
+                    response = call()
+                except RETRYABLE_ERRORS as e:
+                    if isinstance(e, openai.RateLimitError):
+                        self._adjust_limit(self._limit / 2)
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                else:
+                    latency = time.perf_counter() - start
+                    if latency <= self.latency_target:
+                        self._adjust_limit(self._limit + 1 / self._limit)
+                    else:
+                        self._adjust_limit(self._limit * 0.9)
+                    usage = getattr(response, "usage", None)
+                    if usage is not None:
+                        self._tokens.refund(estimated - usage.total_tokens)
+                    return response
+            finally:
+                self._release_slot()
+
+            RETRIES.labels("llm").inc()
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        with self._condition:
+            return {
+                "concurrency_limit": self.concurrency_limit,
+                "in_flight": self._in_flight,
+                "waiting": len(self._waiting),
+            }
+
+
+llm_scheduler = LLMScheduler()
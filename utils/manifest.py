@@ -0,0 +1,130 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from utils.metrics import LLM_CALLS, LLM_CALLS_SKIPPED
+
+load_dotenv()
+
+MANIFEST_ENABLED = os.getenv("COURSE_MANIFEST_ENABLED", "true").lower() != "false"
+MANIFEST_PATH = os.getenv("COURSE_MANIFEST_PATH", os.path.join(".cache", "manifests.sqlite"))
+
+
+def content_hash(*parts: Any) -> str:
+    """
+    Hash of a pipeline step's input: its text plus everything else that changes
+    the answer (prompt version, model, generation settings).
+    """
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CourseManifest:
+    """
+    Results of the previous run of one video, keyed by the content hash of each
+    chunk summary, merge and window extraction. Steps whose hash is unchanged
+    are reused instead of calling the LLM again; the steps of this run become
+    the next manifest.
+    """
+
+    def __init__(self, video_id: str, previous: Optional[Dict[str, Any]] = None):
+        self.video_id = video_id
+        self.previous = previous or {}
+        self.current: Dict[str, Any] = {}
+        self.reused = 0
+        self.computed = 0
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, stage: str, key: str, compute: Callable[[], Any]) -> Any:
+        if key in self.previous:
+            value = self.previous[key]
+            LLM_CALLS.labels(stage, "manifest").inc()
+            LLM_CALLS_SKIPPED.labels(stage, "manifest").inc()
+            with self._lock:
+                self.reused += 1
+                self.current[key] = value
+            return value
+
+        value = compute()
+        with self._lock:
+            self.computed += 1
+            self.current[key] = value
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"reused_calls": self.reused, "computed_calls": self.computed}
+
+
+def reuse_or_compute(manifest: Optional[CourseManifest], stage: str, key: str,
+                     compute: Callable[[], Any]) -> Any:
+    if manifest is None:
+        return compute()
+    return manifest.get_or_compute(stage, key, compute)
+
+
+class ManifestStore:
+    """
+    SQLite store of the latest manifest of every video. Also totals the
+    reused and computed calls of the runs saved by this process.
+    """
+
+    def __init__(self, path: Optional[str] = MANIFEST_PATH):
+        self._lock = threading.Lock()
+        self._db = None
+        self.runs = 0
+        self.reused = 0
+        self.computed = 0
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS manifests ("
+                " video_id TEXT PRIMARY KEY,"
+                " steps TEXT NOT NULL,"
+                " updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    def load(self, video_id: str) -> Optional[CourseManifest]:
+        """
+        Returns a manifest seeded with the video's previous run, or None when
+        manifests are disabled.
+        """
+        if self._db is None:
+            return None
+        with self._lock:
+            row = self._db.execute(
+                "SELECT steps FROM manifests WHERE video_id = ?", (video_id,)).fetchone()
+        return CourseManifest(video_id, json.loads(row[0]) if row else None)
+
+    def save(self, manifest: Optional[CourseManifest]) -> None:
+        if self._db is None or manifest is None:
+            return
+        stats = manifest.stats()
+        with self._lock:
+            self.runs += 1
+            self.reused += stats["reused_calls"]
+            self.computed += stats["computed_calls"]
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifests (video_id, steps, updated_at)"
+                " VALUES (?, ?, ?)",
+                (manifest.video_id, json.dumps(manifest.current, ensure_ascii=False),
+                 time.time()))
+            self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"runs": self.runs, "reused_calls": self.reused,
+                    "computed_calls": self.computed}
+
+
+manifest_store = ManifestStore(MANIFEST_PATH if MANIFEST_ENABLED else None)
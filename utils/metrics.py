@@ -0,0 +1,139 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+STAGE_LATENCY = Histogram(
+    "course_stage_duration_seconds",
+    "Wall-clock duration of a pipeline stage call.",
+    ["stage"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600),
+)
+STAGE_ERRORS = Counter(
+    "course_stage_errors_total",
+    "Pipeline stage calls that raised, by exception type.",
+    ["stage", "error"],
+)
+LLM_CALLS = Counter(
+    "llm_calls_total",
+    "Chat completion calls, split into network calls and cache hits.",
+    ["stage", "source"],
+)
+LLM_CALL_LATENCY = Histogram(
+    "llm_call_duration_seconds",
+    "Latency of chat completion calls that went to the provider.",
+    ["stage"],
+    buckets=(0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120),
+)
+LLM_TOKENS = Histogram(
+    "llm_tokens_per_call",
+    "Prompt/completion tokens per provider call, from the API usage field.",
+    ["stage", "kind"],
+    buckets=(64, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536),
+)
+LLM_TOKENS_TOTAL = Counter(
+    "llm_tokens_total",
+    "Prompt/completion tokens paid for, from the API usage field.",
+    ["stage", "kind"],
+)
+LLM_TIME_TO_FIRST_ITEM = Histogram(
+    "llm_time_to_first_item_seconds",
+    "Time from sending a streamed call until its first JSON item was parsed.",
+    ["stage"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60),
+)
+LLM_ROUTED_CALLS = Counter(
+    "llm_routed_calls_total",
+    "Routed LLM steps by model and outcome (accepted, escalated to the stage"
+    " model, or invalid but kept).",
+    ["stage", "model", "outcome"],
+)
+LLM_CASCADE_SAVED_USD = Counter(
+    "llm_cascade_saved_usd_total",
+    "Estimated USD saved by answers of the cheap cascade model.",
+    ["stage"],
+)
+LLM_CASCADE_OVERHEAD_USD = Counter(
+    "llm_cascade_overhead_usd_total",
+    "Estimated USD spent on cheap cascade answers that were escalated.",
+    ["stage"],
+)
+LLM_CONCURRENCY_LIMIT = Gauge(
+    "llm_concurrency_limit",
+    "Current adaptive limit of chat completion calls in flight.",
+)
+LLM_QUEUE_DEPTH = Gauge(
+    "llm_queue_depth",
+    "Chat completion calls waiting for the scheduler.",
+)
+LLM_CALLS_SKIPPED = Counter(
+    "llm_calls_skipped_total",
+    "LLM calls not made because the step was reused from the manifest of the"
+    " video's last run.",
+    ["stage", "reason"],
+)
+SEGMENT_LINES_FILTERED = Counter(
+    "segment_lines_filtered_total",
+    "Transcript lines left out of segment prompts by the relevance pre-filter.",
+)
+SEGMENT_PROMPT_TOKENS_SAVED = Histogram(
+    "segment_prompt_tokens_saved",
+    "Prompt tokens saved per sampled transcript window by the compact segment prompt,"
+    " compared to the legacy format.",
+    buckets=(0, 100, 250, 500, 1000, 2000, 4000, 8000, 16000),
+)
+SEGMENT_WINDOW_KEPT_RATIO = Histogram(
+    "segment_window_kept_ratio",
+    "Share of a window's transcript lines kept by the relevance pre-filter.",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.8, 1.0),
+)
+PIPELINES_ACTIVE = Gauge(
+    "pipelines_active",
+    "Pipeline slots currently in use.",
+)
+PIPELINES_QUEUED = Gauge(
+    "pipelines_queued",
+    "Requests waiting for pipeline slots.",
+)
+PIPELINES_REJECTED = Counter(
+    "pipelines_rejected_total",
+    "Requests rejected by admission control.",
+    ["reason"],
+)
+RETRIES = Counter(
+    "retries_total",
+    "Retried outbound requests.",
+    ["operation"],
+)
+
+
+@contextmanager
+def track_stage(stage: str):
+    """
+    Records the duration of the wrapped block, and its exception type if it raises.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        STAGE_ERRORS.labels(stage, type(e).__name__).inc()
+        raise
+    finally:
+        STAGE_LATENCY.labels(stage).observe(time.perf_counter() - start)
+
+
+def record_llm_usage(stage: str, response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    for kind, tokens in (("prompt", usage.prompt_tokens),
+                         ("completion", usage.completion_tokens)):
+        LLM_TOKENS.labels(stage, kind).observe(tokens)
+        LLM_TOKENS_TOTAL.labels(stage, kind).inc(tokens)
+
+
+def render_metrics():
+    """
+    Returns the current metrics in the Prometheus text format and its content type.
+    """
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,177 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from dotenv import load_dotenv
+
+from utils.metrics import LLM_CASCADE_OVERHEAD_USD, LLM_CASCADE_SAVED_USD, LLM_ROUTED_CALLS
+
+load_dotenv()
+
+T = TypeVar("T")
+
+# Default to widely available model
+DEFAULT_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
+STAGES = ("chunk_summary", "merge", "segment_extraction")
+
+# Model of every stage, e.g. CHUNK_SUMMARY_MODEL=gpt-4o-mini; OPENAI_MODEL by default
+STAGE_MODELS = {stage: os.getenv(f"{stage.upper()}_MODEL", DEFAULT_MODEL) for stage in STAGES}
+# Optional cheaper model tried first, e.g. SEGMENT_EXTRACTION_CASCADE_MODEL=gpt-4o-mini.
+# Its answer is kept when it passes the stage's validation and the stage model is
+# asked otherwise. LLM_CASCADE_MODEL sets it for every stage at once.
+_CASCADE_DEFAULT = os.getenv("LLM_CASCADE_MODEL", "")
+CASCADE_MODELS = {stage: os.getenv(f"{stage.upper()}_CASCADE_MODEL", _CASCADE_DEFAULT)
+                  for stage in STAGES}
+
+# USD per million (prompt, completion) tokens, used to estimate cascade savings.
+# Matched by longest prefix so dated snapshots share their family's price;
+# LLM_MODEL_PRICES='{"my-model": [1.0, 2.0]}' adds or overrides entries.
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "gpt-3.5-turbo": (0.5, 1.5),
+}
+MODEL_PRICES.update({model: tuple(price) for model, price
+                     in json.loads(os.getenv("LLM_MODEL_PRICES", "{}")).items()})
+
+# Token usage of the provider calls made by the current routed attempt
+_usage: contextvars.ContextVar[Optional[List[Tuple[int, int]]]] = contextvars.ContextVar(
+    "llm_routed_usage", default=None)
+
+
+def models_for(stage: str) -> List[str]:
+    """
+    Models tried for `stage`, in order: the cascade model (if any) and then the
+    stage model.
+    """
+    model = STAGE_MODELS.get(stage, DEFAULT_MODEL)
+    cheap = CASCADE_MODELS.get(stage, "")
+    return [cheap, model] if cheap and cheap != model else [model]
+
+
+def routing_signature() -> Tuple[Tuple[str, ...], ...]:
+    """
+    The model chain of every stage; part of the cache key of a whole course.
+    """
+    return tuple(tuple(models_for(stage)) for stage in STAGES)
+
+
+def note_usage(response) -> None:
+    """
+    Records the token usage of a provider call for the routed attempt it
+    belongs to, if any.
+    """
+    usage = getattr(response, "usage", None)
+    calls = _usage.get()
+    if calls is not None and usage is not None:
+        calls.append((usage.prompt_tokens, usage.completion_tokens))
+
+
+@contextmanager
+def _collect_usage():
+    calls: List[Tuple[int, int]] = []
+    token = _usage.set(calls)
+    try:
+        yield calls
+    finally:
+        _usage.reset(token)
+
+
+def _price(model: str) -> Optional[Tuple[float, float]]:
+    matches = [prefix for prefix in MODEL_PRICES if model.startswith(prefix)]
+    return MODEL_PRICES[max(matches, key=len)] if matches else None
+
+
+def estimate_cost(model: str, calls: List[Tuple[int, int]]) -> Optional[float]:
+    """
+    Estimated USD cost of `calls` (prompt, completion tokens) on `model`, or
+    None when its price is unknown.
+    """
+    price = _price(model)
+    if price is None:
+        return None
+    return sum(prompt * price[0] + completion * price[1] for prompt, completion in calls) / 1e6
+
+
+class ModelRouter:
+    """
+    Runs each LLM step on the models of its stage (see `models_for`): a cheap
+    cascade model first, escalating to the stage model only when the answer
+    fails the step's validation. Keeps the routing decisions and the estimated
+    savings of the answers the cheap model got right.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Tuple[str, str, str], int] = {}
+        self._saved: Dict[str, float] = {}
+        self._overhead: Dict[str, float] = {}
+
+    def _record(self, stage: str, model: str, outcome: str) -> None:
+        LLM_ROUTED_CALLS.labels(stage, model, outcome).inc()
+        with self._lock:
+            key = (stage, model, outcome)
+            self._calls[key] = self._calls.get(key, 0) + 1
+
+    def _add(self, totals: Dict[str, float], metric, stage: str, usd: Optional[float]) -> None:
+        if usd is None or usd <= 0:
+            return
+        metric.labels(stage).inc(usd)
+        with self._lock:
+            totals[stage] = totals.get(stage, 0.0) + usd
+
+    def route(self, stage: str, attempt: Callable[[str, bool], T],
+              validate: Callable[[T], bool]) -> T:
+        """
+        Calls `attempt(model, is_last)` on every model of the stage in turn and
+        returns the first answer that passes `validate`. The stage model's
+        answer is returned even when it does not pass, as without a cascade.
+        """
+        models = models_for(stage)
+        for position, model in enumerate(models):
+            last = position == len(models) - 1
+            with _collect_usage() as calls:
+                result = attempt(model, last)
+            valid = validate(result)
+            if last:
+                self._record(stage, model, "accepted" if valid else "invalid")
+                return result
+
+            cost = estimate_cost(model, calls)
+            if valid:
+                self._record(stage, model, "accepted")
+                # The stage model would have read the same prompt; its answer
+                # length is estimated by the cheap model's
+                strong = estimate_cost(models[-1], calls)
+                if cost is not None and strong is not None:
+                    self._add(self._saved, LLM_CASCADE_SAVED_USD, stage, strong - cost)
+                return result
+            self._record(stage, model, "escalated")
+            self._add(self._overhead, LLM_CASCADE_OVERHEAD_USD, stage, cost)
+        raise AssertionError("unreachable")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {}
+            for stage in STAGES:
+                calls = {f"{model}:{outcome}": count
+                         for (s, model, outcome), count in sorted(self._calls.items())
+                         if s == stage}
+                stages[stage] = {
+                    "models": models_for(stage),
+                    "calls": calls,
+                    "estimated_saved_usd": round(self._saved.get(stage, 0.0), 6),
+                    "escalation_overhead_usd": round(self._overhead.get(stage, 0.0), 6),
+                }
+            return stages
+
+
+# Shared by every module that talks to the LLM
+model_router = ModelRouter()
@@ -0,0 +1,14 @@
+import os
+
+from dotenv import load_dotenv
+from openai import OpenAI
+
+load_dotenv()
+
+# Shared by every module that talks to the LLM. Retries are left to
+# utils.llm_scheduler, which needs to see rate limit errors to adapt.
+client = OpenAI(
+    api_key=os.getenv("OPENAI_API_KEY"),
+    base_url=os.getenv("OPENAI_API_BASE"),
+    max_retries=0,
+)
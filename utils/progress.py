@@ -0,0 +1,38 @@
+import threading
+from typing import Callable, Optional
+
+# Called with (completed, total) every time a unit of work finishes
+ProgressCallback = Callable[[int, int], None]
+
+
+class ProgressCounter:
+    """
+    Thread-safe counter of finished work units that forwards every update to an
+    optional callback. `advance` can be passed directly to
+    `Future.add_done_callback`.
+    """
+
+    def __init__(self, total: int, callback: Optional[ProgressCallback] = None):
+        self.total = total
+        self.completed = 0
+        self._callback = callback
+        self._lock = threading.Lock()
+        if callback is not None:
+            callback(0, total)
+
+    def grow(self, units: int = 1) -> None:
+        """
+        Adds work units discovered while the work is already running.
+        """
+        with self._lock:
+            self.total += units
+            completed, total = self.completed, self.total
+        if self._callback is not None:
+            self._callback(completed, total)
+
+    def advance(self, *_) -> None:
+        with self._lock:
+            self.completed += 1
+            completed, total = self.completed, self.total
+        if self._callback is not None:
+            self._callback(completed, total)
@@ -0,0 +1,123 @@
+import math
+import re
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple, Union
+
+from utils.transcript import Transcript
+
+_WORD = re.compile(r"\w+")
+# Filler words of lecture captions that carry no topic
+STOPWORDS = frozenset("""
+a an and are as at be been but by can do does for from had has have he her his how i if in
+into is it its just know like me more my no not of on one or our out so some than that the
+their them then there these they this to uh um up us was we were what when where which who
+will with would yeah you your okay ok right gonna let's
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a list of short documents (caption lines), backed by an
+    inverted index so scoring a query only touches the documents that share a
+    term with it.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        lengths = []
+        for idx, document in enumerate(documents):
+            terms = Counter(tokenize(document))
+            lengths.append(sum(terms.values()))
+            for term, tf in terms.items():
+                self._postings[term].append((idx, tf))
+        average = (sum(lengths) / self.size) if self.size else 0.0
+        # Length normalization of every document, precomputed once
+        self._norms = [k1 * (1 - b + b * length / average) if average else k1
+                       for length in lengths]
+
+    def idf(self, term: str) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (self.size - df + 0.5) / (df + 0.5))
+
+    def scores(self, query: str) -> List[float]:
+        scores = [0.0] * self.size
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self.idf(term)
+            for idx, tf in postings:
+                scores[idx] += idf * tf * (self.k1 + 1) / (tf + self._norms[idx])
+        return scores
+
+
+def relevant_ranges(starts: Sequence[float], texts: Sequence[str], queries: Sequence[str],
+                    keep_ratio: float, padding_seconds: float) -> List[Tuple[int, int]]:
+    """
+    Scores every line against each query (a line's score is its best match)
+    and returns sorted, merged [lo, hi) line ranges around the best matching
+    lines, each padded by `padding_seconds` on both sides. Lines are taken in
+    score order until the ranges cover `keep_ratio` of all lines.
+    Returns no ranges when no line matches any query.
+    """
+    index = BM25Index(texts)
+    best = [0.0] * len(texts)
+    for query in queries:
+        for idx, score in enumerate(index.scores(query)):
+            if score > best[idx]:
+                best[idx] = score
+
+    budget = max(1, math.ceil(keep_ratio * len(texts)))
+    kept = bytearray(len(texts))
+    covered = 0
+    for idx in sorted((i for i, score in enumerate(best) if score > 0),
+                      key=best.__getitem__, reverse=True):
+        if covered >= budget:
+            break
+        lo = bisect_left(starts, starts[idx] - padding_seconds)
+        hi = bisect_right(starts, starts[idx] + padding_seconds)
+        covered += hi - lo - sum(kept[lo:hi])
+        kept[lo:hi] = b"\x01" * (hi - lo)
+
+    ranges: List[Tuple[int, int]] = []
+    for idx, flag in enumerate(kept):
+        if not flag:
+            continue
+        if ranges and ranges[-1][1] == idx:
+            ranges[-1] = (ranges[-1][0], idx + 1)
+        else:
+            ranges.append((idx, idx + 1))
+    return ranges
+
+
+def filter_relevant_entries(entries: Union[Transcript, List[Dict[str, float]]],
+                            queries: Sequence[str], keep_ratio: float,
+                            padding_seconds: float) -> List[Dict[str, float]]:
+    """
+    Keeps the transcript entries relevant to the queries (see
+    `relevant_ranges`) with their original timestamps. Falls back to all
+    entries when nothing matches, so no window is dropped on a vocabulary
+    mismatch alone.
+    """
+    if isinstance(entries, Transcript):
+        starts, texts = list(entries.starts), entries.texts()
+    else:
+        starts = [e.get("start", 0.0) for e in entries]
+        texts = [e.get("text", "") for e in entries]
+
+    ranges = relevant_ranges(starts, texts, [str(q) for q in queries],
+                             keep_ratio, padding_seconds)
+    if not ranges:
+        return list(entries)
+    kept = []
+    for lo, hi in ranges:
+        kept += list(entries[lo:hi])
+    return kept
@@ -1,5 +1,5 @@
 import re
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
 
 def parse_time(time_str: str) -> float:
@@ -29,6 +29,60 @@ def format_time(sec: float) -> str:
         return f"{hours:02d}:{minutes:02d}:{seconds_float:05.2f}"
 
 
+# (start_seconds, end_seconds, description)
+Interval = Tuple[float, float, str]
+
+_SEGMENT_PATTERN = re.compile(
+    r"^(?P<start>[\d:.]+)\s*–\s*(?P<end>[\d:.]+)\s*\|\s*(?P<desc>.+)$"
+)
+_NON_WORD = re.compile(r"[\W_]+")
+
+
+def parse_segment(segment: str) -> Interval:
+    """
+    Parses a "HH:MM:SS – HH:MM:SS | Description" segment into a numeric interval.
+    """
+    m = _SEGMENT_PATTERN.match(segment.strip())
+    if not m:
+        raise ValueError(f"Invalid segment format: {segment}")
+    return parse_time(m.group("start")), parse_time(m.group("end")), m.group("desc").strip()
+
+
+def format_segment(interval: Interval) -> str:
+    start, end, desc = interval
+    return f"{format_time(start)} – {format_time(end)} | {desc}"
+
+
+def merge_intervals(intervals: Iterable[Interval], max_gap: float = 1.0) -> List[Interval]:
+    """
+    Sorts the intervals by start time and coalesces, in a single sweep, every
+    interval that overlaps or starts within `max_gap` seconds of the previous
+    merged one. Descriptions of merged intervals are joined with " / ", skipping
+    ones that only differ in case, spacing or punctuation, so the same segment
+    extracted from two overlapping windows appears once.
+
+    Runs in O(n log n), which keeps batch runs with many windows cheap.
+    """
+    merged: List[Interval] = []
+    descriptions: List[List[str]] = []
+    seen = set()
+    for start, end, desc in sorted(intervals, key=lambda interval: interval[0]):
+        key = _NON_WORD.sub(" ", desc).strip().lower()
+        if merged and start - merged[-1][1] <= max_gap:
+            prev_start, prev_end, _ = merged[-1]
+            merged[-1] = (prev_start, max(prev_end, end), "")
+        else:
+            merged.append((start, end, ""))
+            descriptions.append([])
+            seen = set()
+        if key not in seen:
+            seen.add(key)
+            descriptions[-1].append(desc)
+
+    return [(start, end, " / ".join(descs))
+            for (start, end, _), descs in zip(merged, descriptions)]
+
+
 def sort_and_merge_segments(segments: List[str]) -> List[str]:
     """
     Given a list of segments in the format "HH:MM:SS – HH:MM:SS | Description",
@@ -37,48 +91,8 @@ def sort_and_merge_segments(segments: List[str]) -> List[str]:
 
     Returns a new list of merged segments in the same format.
     """
-    parsed: List[Tuple[float, float, str]] = []
-    pattern = re.compile(
-        r"^(?P<start>[\d:.]+)\s*–\s*(?P<end>[\d:.]+)\s*\|\s*(?P<desc>.+)$"
-    )
-
-    for seg in segments:
-        m = pattern.match(seg.strip())
-        if not m:
-            raise ValueError(f"Invalid segment format: {seg}")
-        start_sec = parse_time(m.group("start"))
-        end_sec = parse_time(m.group("end"))
-        desc = m.group("desc").strip()
-        parsed.append((start_sec, end_sec, desc))
-
-    # Sort by start time
-    parsed.sort(key=lambda x: x[0])
-
-    # Merge segments with gap <= 1 second
-    merged: List[Tuple[float, float, str]] = []
-    for start, end, desc in parsed:
-        if not merged:
-            merged.append((start, end, desc))
-        else:
-            prev_start, prev_end, prev_desc = merged[-1]
-            if start - prev_end <= 1.0:
-                # Merge: extend end and combine descriptions
-                merged[-1] = (
-                    prev_start,
-                    max(prev_end, end),
-                    f"{prev_desc} / {desc}"
-                )
-            else:
-                merged.append((start, end, desc))
-
-    # Format output
-    result: List[str] = []
-    for start_sec, end_sec, desc in merged:
-        start_str = format_time(start_sec)
-        end_str = format_time(end_sec)
-        result.append(f"{start_str} – {end_str} | {desc}")
-
-    return result
+    return [format_segment(interval)
+            for interval in merge_intervals(parse_segment(seg) for seg in segments)]
 
 
 # Example usage:
@@ -0,0 +1,60 @@
+import os
+from typing import Any, Dict
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# "auto" uses JSON schemas with models that support structured outputs and plain
+# JSON mode with older ones; "json_schema" or "json_object" force one of them
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "auto").lower()
+
+# Model families that accept response_format={"type": "json_schema"}
+_JSON_SCHEMA_MODELS = ("gpt-4o", "gpt-4.1", "gpt-5", "o1", "o3", "o4")
+_JSON_SCHEMA_EXCEPTIONS = ("gpt-4o-2024-05-13",)
+
+POINTS_SCHEMA = {
+    "type": "object",
+    "properties": {"points": {"type": "array", "items": {"type": "string"}}},
+    "required": ["points"],
+    "additionalProperties": False,
+}
+
+SEGMENTS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "segments": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "start": {"type": "number"},
+                    "end": {"type": "number"},
+                    "purpose": {"type": "string"},
+                },
+                "required": ["start", "end", "purpose"],
+                "additionalProperties": False,
+            },
+        },
+    },
+    "required": ["segments"],
+    "additionalProperties": False,
+}
+
+
+def supports_json_schema(model: str) -> bool:
+    return model.startswith(_JSON_SCHEMA_MODELS) and not model.startswith(_JSON_SCHEMA_EXCEPTIONS)
+
+
+def json_response_format(model: str, name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Returns the response_format that constrains `model` to `schema`, or JSON
+    mode when the model does not support schemas (the prompt then has to
+    describe the shape).
+    """
+    use_schema = (LLM_STRUCTURED_OUTPUT == "json_schema"
+                  or (LLM_STRUCTURED_OUTPUT == "auto" and supports_json_schema(model)))
+    if use_schema:
+        return {"type": "json_schema",
+                "json_schema": {"name": name, "strict": True, "schema": schema}}
+    return {"type": "json_object"}
@@ -0,0 +1,168 @@
+import mmap
+import os
+import re
+from typing import BinaryIO, Dict, Iterator, List, Optional, TextIO, Union
+
+# Files at least this large are memory-mapped instead of read through a buffer
+MMAP_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+SubtitleSource = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO, TextIO]
+
+_TIMESTAMP = r"(?:\d+:)?\d{1,2}:\d{2}(?:[,.]\d{1,3})?"
+_TIMING_LINE = re.compile(
+    rf"^\s*(?P<start>{_TIMESTAMP})\s*-->\s*(?P<end>{_TIMESTAMP})?(?:\s+.*)?$")
+_END_ONLY_LINE = re.compile(rf"^\s*(?P<end>{_TIMESTAMP})(?:\s+.*)?$")
+_VTT_TAG = re.compile(r"<[^>]*>")
+_VTT_METADATA_BLOCKS = ("NOTE", "STYLE", "REGION")
+
+
+def _timestamp_to_seconds(timestamp: str) -> float:
+    """
+    Converts "HH:MM:SS,mmm", "HH:MM:SS.mmm" or "MM:SS.mmm" into seconds.
+    """
+    parts = timestamp.replace(",", ".").split(":")
+    seconds = float(parts[-1])
+    minutes = int(parts[-2])
+    hours = int(parts[-3]) if len(parts) > 2 else 0
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def _iter_buffer_lines(buffer) -> Iterator[str]:
+    """
+    Yields decoded lines of a bytes-like or mmap buffer without copying it whole.
+    """
+    position, size = 0, len(buffer)
+    while position < size:
+        newline = buffer.find(b"\n", position)
+        if newline == -1:
+            newline = size
+        yield bytes(buffer[position:newline]).decode("utf-8", errors="replace")
+        position = newline + 1
+
+
+def _iter_file_lines(file_obj) -> Iterator[str]:
+    for line in file_obj:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8", errors="replace")
+        yield line
+
+
+def _iter_source_lines(source: SubtitleSource) -> Iterator[str]:
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        yield from _iter_buffer_lines(source)
+        return
+
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, "rb") as f:
+            if os.fstat(f.fileno()).st_size >= MMAP_THRESHOLD_BYTES:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield from _iter_buffer_lines(mapped)
+            else:
+                yield from _iter_file_lines(f)
+        return
+
+    yield from _iter_file_lines(source)
+
+
+def _make_entry(start: float, end: float, lines: List[str],
+                is_vtt: bool) -> Optional[Dict[str, float]]:
+    text = " ".join(lines)
+    if is_vtt:
+        text = " ".join(_VTT_TAG.sub("", text).split())
+    if not text:
+        return None
+    return {
+        "text": text,
+        "start": round(start, 3),
+        "duration": round(end - start, 3),
+    }
+
+
+def iter_subtitle_entries(source: SubtitleSource) -> Iterator[Dict[str, float]]:
+    """
+    Lazily parses an SRT or WebVTT subtitle and yields transcript entries of the
+    form {"text", "start", "duration"} (seconds, rounded to milliseconds) as soon
+    as each cue is complete.
+
+    `source` can be a file path, a text or binary file object, or bytes. Large
+    files are memory-mapped. The format is detected from the "WEBVTT" header.
+    The parser tolerates CRLF line endings, a UTF-8 BOM, blank lines inside cue
+    text, and timecodes whose end time is on the following line. WebVTT
+    NOTE/STYLE/REGION blocks, cue settings and inline tags are dropped.
+    """
+    is_vtt = False
+    first_line = True
+    in_header = False
+    skipping_block = False
+    after_blank = True
+
+    start: Optional[float] = None
+    end: Optional[float] = None
+    awaiting_end = False
+    text_lines: List[str] = []
+    # Line that may be the identifier (SRT index / VTT cue id) of the next cue
+    candidate_id: Optional[str] = None
+
+    for raw_line in _iter_source_lines(source):
+        line = raw_line.rstrip("\r\n").strip()
+        if first_line:
+            line = line.lstrip("\ufeff")
+            first_line = False
+            if line.startswith("WEBVTT"):
+                is_vtt = in_header = True
+                continue
+
+        if not line:
+            in_header = skipping_block = False
+            after_blank = True
+            if candidate_id is not None:
+                text_lines.append(candidate_id)
+                candidate_id = None
+            continue
+        if in_header or skipping_block:
+            continue
+        if is_vtt and after_blank and line.split(" ", 1)[0] in _VTT_METADATA_BLOCKS:
+            skipping_block = True
+            continue
+
+        if awaiting_end:
+            match = _END_ONLY_LINE.match(line)
+            if match:
+                end = _timestamp_to_seconds(match.group("end"))
+                awaiting_end = False
+                after_blank = False
+                continue
+            awaiting_end = False
+
+        match = _TIMING_LINE.match(line)
+        if match:
+            if start is not None:
+                entry = _make_entry(start, end if end is not None else start,
+                                    text_lines, is_vtt)
+                if entry is not None:
+                    yield entry
+            start = _timestamp_to_seconds(match.group("start"))
+            end = (_timestamp_to_seconds(match.group("end"))
+                   if match.group("end") else None)
+            awaiting_end = end is None
+            text_lines = []
+            candidate_id = None
+            after_blank = False
+            continue
+
+        if candidate_id is not None:
+            text_lines.append(candidate_id)
+            candidate_id = None
+        if after_blank or line.isdigit():
+            candidate_id = line
+        elif start is not None:
+            text_lines.append(line)
+        after_blank = False
+
+    if candidate_id is not None:
+        text_lines.append(candidate_id)
+    if start is not None:
+        entry = _make_entry(start, end if end is not None else start,
+                            text_lines, is_vtt)
+        if entry is not None:
+            yield entry
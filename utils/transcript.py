@@ -0,0 +1,116 @@
+from array import array
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+class Transcript:
+    """
+    Compact, read-only transcript stored column-wise: start times and durations
+    live in float arrays and every caption text in one string buffer addressed
+    by offsets. Entries are kept sorted by start time.
+
+    Slicing (by index or with `slice_time`) returns a view that shares the
+    underlying buffers, so overlapping windows cost no copies. Indexing and
+    iteration yield {"text", "start", "duration"} dicts, so code written for
+    lists of entry dicts keeps working.
+    """
+
+    __slots__ = ("_starts", "_durations", "_text", "_offsets", "_lo", "_hi")
+
+    def __init__(self, starts: array, durations: array, text: str,
+                 offsets: array, lo: int = 0, hi: Optional[int] = None):
+        self._starts = starts
+        self._durations = durations
+        self._text = text
+        self._offsets = offsets
+        self._lo = lo
+        self._hi = len(starts) if hi is None else hi
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, float]]) -> "Transcript":
+        """
+        Builds a transcript from {"text", "start", "duration"} dicts.
+        """
+        if isinstance(entries, Transcript):
+            return entries
+        entries = list(entries)
+        if any(a["start"] > b["start"] for a, b in zip(entries, entries[1:])):
+            entries.sort(key=lambda e: e["start"])
+
+        texts = [str(e.get("text", "")) for e in entries]
+        return cls(
+            array("d", (float(e.get("start", 0.0)) for e in entries)),
+            array("d", (float(e.get("duration", 0.0)) for e in entries)),
+            "".join(texts),
+            array("q", accumulate((len(t) for t in texts), initial=0)),
+        )
+
+    def __len__(self) -> int:
+        return self._hi - self._lo
+
+    def __getitem__(self, idx: Union[int, slice]):
+        if isinstance(idx, slice):
+            lo, hi, step = idx.indices(len(self))
+            if step != 1:
+                raise ValueError("Transcript slices do not support steps")
+            return self._view(lo, max(lo, hi))
+
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("Transcript index out of range")
+        i = self._lo + idx
+        return {
+            "text": self._text[self._offsets[i]:self._offsets[i + 1]],
+            "start": self._starts[i],
+            "duration": self._durations[i],
+        }
+
+    def __iter__(self) -> Iterator[Dict[str, float]]:
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def _view(self, lo: int, hi: int) -> "Transcript":
+        return Transcript(self._starts, self._durations, self._text,
+                          self._offsets, self._lo + lo, self._lo + hi)
+
+    @property
+    def starts(self) -> memoryview:
+        return memoryview(self._starts)[self._lo:self._hi]
+
+    @property
+    def durations(self) -> memoryview:
+        return memoryview(self._durations)[self._lo:self._hi]
+
+    def texts(self) -> List[str]:
+        text, offsets = self._text, self._offsets
+        return [text[offsets[i]:offsets[i + 1]] for i in range(self._lo, self._hi)]
+
+    def full_text(self, separator: str = " ") -> str:
+        return separator.join(self.texts())
+
+    def slice_time(self, start: float, end: float) -> "Transcript":
+        """
+        Returns a view of the entries whose start time falls within [start, end).
+        """
+        starts = self.starts
+        return self._view(bisect_left(starts, start), bisect_left(starts, end))
+
+    def format_timestamps(self) -> Tuple[List[str], List[str]]:
+        """
+        Formats the start and end time of every entry as "HH:MM:SS.ss" in a
+        single pass over the columns.
+        """
+        def fmt(sec: float) -> str:
+            minutes, seconds = divmod(sec, 60)
+            hours, minutes = divmod(int(minutes), 60)
+            return f"{hours:02d}:{minutes:02d}:{seconds:05.2f}"
+
+        starts = self._starts[self._lo:self._hi]
+        durations = self._durations[self._lo:self._hi]
+        return ([fmt(s) for s in starts],
+                [fmt(s + d) for s, d in zip(starts, durations)])
+
+    def to_entries(self) -> List[Dict[str, float]]:
+        return list(self)
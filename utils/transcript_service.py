@@ -0,0 +1,204 @@
+import asyncio
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Union
+
+import httpx
+from dotenv import load_dotenv
+
+from utils.metrics import RETRIES
+from utils.transcript import Transcript
+
+load_dotenv()
+
+TRANSCRIPT_SERVICE_TIMEOUT = float(os.getenv("TRANSCRIPT_SERVICE_TIMEOUT", "30"))
+TRANSCRIPT_SERVICE_CONNECT_TIMEOUT = float(
+    os.getenv("TRANSCRIPT_SERVICE_CONNECT_TIMEOUT", "5"))
+TRANSCRIPT_SERVICE_MAX_RETRIES = int(os.getenv("TRANSCRIPT_SERVICE_MAX_RETRIES", "3"))
+TRANSCRIPT_SERVICE_BACKOFF = float(os.getenv("TRANSCRIPT_SERVICE_BACKOFF", "0.5"))
+TRANSCRIPT_SERVICE_MAX_CONNECTIONS = int(
+    os.getenv("TRANSCRIPT_SERVICE_MAX_CONNECTIONS", "20"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TranscriptError(Exception):
+    """
+    Base class of transcript fetching errors.
+    """
+
+
+class TranscriptNotFoundError(TranscriptError):
+    """
+    The service answered, but the video has no transcript.
+    """
+
+
+class TranscriptServiceError(TranscriptError):
+    """
+    The transcript service is unreachable or kept failing after all retries.
+    """
+
+
+class TranscriptFetcher:
+    """
+    Client of the YouTube transcript service that keeps pooled keep-alive
+    connections, applies timeouts and retries 429/5xx responses and network
+    errors with jittered exponential backoff (honoring Retry-After).
+    """
+
+    def __init__(self, base_url: Optional[str] = None,
+                 timeout: float = TRANSCRIPT_SERVICE_TIMEOUT,
+                 connect_timeout: float = TRANSCRIPT_SERVICE_CONNECT_TIMEOUT,
+                 max_retries: int = TRANSCRIPT_SERVICE_MAX_RETRIES,
+                 backoff: float = TRANSCRIPT_SERVICE_BACKOFF,
+                 max_connections: int = TRANSCRIPT_SERVICE_MAX_CONNECTIONS):
+        self.base_url = base_url or os.getenv("YOUTUBE_TRANSCRIPT_SERVICE_URL", "")
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections,
+                                    max_keepalive_connections=max_connections)
+        self._client = httpx.Client(timeout=self._timeout, limits=self._limits)
+        # AsyncClient connections are bound to the event loop that created them
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._async_loop = None
+
+    @property
+    def url(self) -> str:
+        if not self.base_url:
+            raise TranscriptServiceError(
+                "YOUTUBE_TRANSCRIPT_SERVICE_URL is not configured")
+        return f"{self.base_url}/transcript"
+
+    def _retry_delay(self, attempt: int,
+                     response: Optional[httpx.Response] = None) -> float:
+        if response is not None:
+            retry_after = response.headers.get("Retry-After")
+            if retry_after:
+                try:
+                    return float(retry_after)
+                except ValueError:
+                    pass
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    @staticmethod
+    def _to_transcript(video_id: str, response: httpx.Response) -> Transcript:
+        if response.status_code == 404:
+            raise TranscriptNotFoundError(f"No transcript found for video {video_id}")
+        if response.status_code >= 400:
+            raise TranscriptServiceError(
+                f"Transcript service returned {response.status_code} for video {video_id}")
+        try:
+            entries = response.json()
+        except ValueError as e:
+            raise TranscriptServiceError(
+                f"Transcript service returned invalid JSON for video {video_id}") from e
+        if not entries:
+            raise TranscriptNotFoundError(f"No transcript found for video {video_id}")
+        return Transcript.from_entries(entries)
+
+    def fetch(self, video_id: str) -> Transcript:
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = self._client.get(self.url,
+                                            params={"video": video_id})
+            except httpx.HTTPError as e:
+                error = e
+            retryable = error is not None or response.status_code in RETRY_STATUS_CODES
+            if not retryable or attempt >= self.max_retries:
+                break
+            RETRIES.labels("transcript_fetch").inc()
+            time.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+        if error is not None:
+            raise TranscriptServiceError(
+                f"Transcript service is unreachable: {error}") from error
+        return self._to_transcript(video_id, response)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = httpx.AsyncClient(timeout=self._timeout,
+                                                   limits=self._limits)
+            self._async_loop = loop
+        return self._async_client
+
+    async def afetch(self, video_id: str) -> Transcript:
+        client = self._get_async_client()
+        attempt = 0
+        while True:
+            response, error = None, None
+            try:
+                response = await client.get(self.url,
+                                            params={"video": video_id})
+            except httpx.HTTPError as e:
+                error = e
+            retryable = error is not None or response.status_code in RETRY_STATUS_CODES
+            if not retryable or attempt >= self.max_retries:
+                break
+            RETRIES.labels("transcript_fetch").inc()
+            await asyncio.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+        if error is not None:
+            raise TranscriptServiceError(
+                f"Transcript service is unreachable: {error}") from error
+        return self._to_transcript(video_id, response)
+
+    def fetch_many(self, video_ids: Iterable[str],
+                   max_concurrency: Optional[int] = None
+                   ) -> Dict[str, Union[Transcript, TranscriptError]]:
+        """
+        Fetches many transcripts over the shared pool. Returns a mapping from
+        video ID to its transcript, or to the error raised for that video.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        if not video_ids:
+            return {}
+
+        def fetch_one(video_id: str):
+            try:
+                return self.fetch(video_id)
+            except TranscriptError as e:
+                return e
+
+        workers = min(max_concurrency or self.max_connections, len(video_ids))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return dict(zip(video_ids, executor.map(fetch_one, video_ids)))
+
+    async def afetch_many(self, video_ids: Iterable[str],
+                          max_concurrency: Optional[int] = None
+                          ) -> Dict[str, Union[Transcript, TranscriptError]]:
+        """
+        Async counterpart of `fetch_many`.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        semaphore = asyncio.Semaphore(max_concurrency or self.max_connections)
+
+        async def fetch_one(video_id: str):
+            async with semaphore:
+                try:
+                    return await self.afetch(video_id)
+                except TranscriptError as e:
+                    return e
+
+        results = await asyncio.gather(*(fetch_one(v) for v in video_ids))
+        return dict(zip(video_ids, results))
+
+    def close(self) -> None:
+        self._client.close()
+
+    async def aclose(self) -> None:
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+
+transcript_fetcher = TranscriptFetcher()
@@ -1,4 +1,7 @@
-from typing import List, Dict
+import math
+from typing import List, Dict, Tuple, Union
+
+from utils.transcript import Transcript
 
 
 def _seconds_to_timestamp(sec: float) -> str:
@@ -13,7 +16,7 @@ def _seconds_to_timestamp(sec: float) -> str:
 
 
 def transcripts_to_prompt_format(
-    transcripts: List[Dict[str, float]]
+    transcripts: Union[Transcript, List[Dict[str, float]]]
 ) -> List[str]:
     """
     ورودی: لیستی از دیکشنری‌ها به شکل
@@ -25,6 +28,11 @@ def transcripts_to_prompt_format(
     خروجی: لیستی از رشته‌ها با فرمت:
         [HH:MM:SS.ss - HH:MM:SS.ss] متن
     """
+    if isinstance(transcripts, Transcript):
+        start_ts, end_ts = transcripts.format_timestamps()
+        return [f"[{s} - {e}] {text.strip()}"
+                for s, e, text in zip(start_ts, end_ts, transcripts.texts())]
+
     prompt_lines = []
     for entry in transcripts:
         text = entry.get("text", "").strip()
@@ -39,3 +47,56 @@ def transcripts_to_prompt_format(
         prompt_lines.append(line)
 
     return prompt_lines
+
+
+def _collapse_lines(starts: List[float], texts: List[str], max_chars: int,
+                    max_gap: float, ends: List[float]) -> Tuple[List[float], List[str]]:
+    """
+    ادغام خطوط کوتاه و پشت‌سرهم زیرنویس در قالب جمله، تا رسیدن به علامت پایان
+    جمله، سقف طول یا فاصله‌ی زمانی بیش از max_gap
+    """
+    merged_starts: List[float] = []
+    merged_texts: List[str] = []
+    previous_end = None
+    for start, end, text in zip(starts, ends, texts):
+        if (merged_texts
+                and not merged_texts[-1].endswith((".", "?", "!"))
+                and len(merged_texts[-1]) + len(text) < max_chars
+                and start - previous_end <= max_gap):
+            merged_texts[-1] = f"{merged_texts[-1]} {text}"
+        else:
+            merged_starts.append(start)
+            merged_texts.append(text)
+        previous_end = end
+    return merged_starts, merged_texts
+
+
+def transcripts_to_compact_prompt_format(
+    transcripts: Union[Transcript, List[Dict[str, float]]],
+    collapse: bool = False,
+    max_chars: int = 240,
+    max_gap: float = 2.0,
+) -> Tuple[int, List[str]]:
+    """
+    قالب فشرده برای کاهش توکن‌های پرامپت: هر خط به شکل "<offset> متن" است که
+    offset تعداد ثانیه‌ی صحیح از ابتدای پنجره است.
+
+    خروجی: (زمان پایه بر حسب ثانیه‌ی صحیح، لیست خطوط). با collapse=True خطوط
+    کوتاه پشت‌سرهم در قالب جمله ادغام می‌شوند.
+    """
+    if isinstance(transcripts, Transcript):
+        starts = list(transcripts.starts)
+        ends = [s + d for s, d in zip(starts, transcripts.durations)]
+        texts = [t.strip() for t in transcripts.texts()]
+    else:
+        starts = [float(e.get("start", 0.0)) for e in transcripts]
+        ends = [s + float(e.get("duration", 0.0)) for s, e in zip(starts, transcripts)]
+        texts = [e.get("text", "").strip() for e in transcripts]
+
+    if not starts:
+        return 0, []
+    if collapse:
+        starts, texts = _collapse_lines(starts, texts, max_chars, max_gap, ends)
+
+    base = math.floor(min(starts))
+    return base, [f"{round(start - base)} {text}" for start, text in zip(starts, texts)]